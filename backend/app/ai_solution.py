@@ -1,9 +1,17 @@
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, List, Optional
+from decouple import config
 from .huggingface_client import HuggingFaceClient
 
 logger = logging.getLogger(__name__)
 
+# Once a scan completes, generate the solutions it could not (model not loaded,
+# generation failed) through the Hugging Face API; needs HF_API_KEY
+HF_SCAN_REMEDIATION = config("HF_SCAN_REMEDIATION", default=False, cast=bool)
+# Findings of one bulk call being remediated at the same time
+HF_BULK_PARALLELISM = config("HF_BULK_PARALLELISM", default=8, cast=int)
+
 # Initialize the client
 hf_client = HuggingFaceClient()
 
@@ -15,4 +23,21 @@ async def generate_ai_solution(vulnerability_data: Dict) -> str:
         return await hf_client.generate_cybersecurity_solution(vulnerability_data)
     except Exception as e:
         logger.error(f"Error generating AI solution: {str(e)}")
-        return hf_client._get_fallback_solution(vulnerability_data)
\ No newline at end of file
+        return hf_client._get_fallback_solution(vulnerability_data)
+
+async def generate_ai_solutions(vulnerabilities: List[Dict], parallelism: int = HF_BULK_PARALLELISM) -> List[Optional[str]]:
+    """
+    Generate solutions for all findings of a scan, at most `parallelism`
+    at a time. Results are in the same order as the input, None where only
+    the generic fallback was available.
+    """
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def generate(vulnerability_data: Dict) -> Optional[str]:
+        async with semaphore:
+            solution = await generate_ai_solution(vulnerability_data)
+        if solution == hf_client._get_fallback_solution(vulnerability_data):
+            return None
+        return solution
+
+    return await asyncio.gather(*(generate(vulnerability) for vulnerability in vulnerabilities))
@@ -1,58 +1,46 @@
-from fastapi import FastAPI, Body, Depends, Query, HTTPException, Request
+from fastapi import FastAPI, BackgroundTasks, Body, Depends, File, Query, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from app.auth.auth_bearer import JWTBearer
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app.auth.auth_bearer import JWTBearer, get_current_user
 from app.auth.auth_handler import sign_jwt
-from app.model import PostSchema, UserSignupSchema, UserLoginSchema, ScanResult
-from app.database import user_collection, scan_collection, add_finding, retrieve_scan_findings, retrieve_user_scans
-from datetime import datetime, timedelta
-import jwt
+from app.auth.passwords import password_hasher, needs_rehash
+from app.model import PostSchema, UserSignupSchema, UserLoginSchema, BatchScanSchema
+from app.database import (
+    scan_collection, ensure_indexes, migrate_findings, add_user, add_post, retrieve_posts, retrieve_user_by_email, update_user, retrieve_scan, update_scan,
+    retrieve_scan_findings, retrieve_scan_findings_page, retrieve_user_scans, retrieve_user_scans_page,
+    retrieve_previous_scan, retrieve_scan_fingerprints, active_scan_key, retrieve_active_scan,
+    retrieve_fresh_scan, retrieve_scan_findings_seen_since, latest_finding_seen_at, retrieve_finding, retrieve_user_scan_ids, iter_findings, update_finding_solution, finding_helper, SCAN_SUMMARY_PROJECTION, FINDING_SUMMARY_PROJECTION
+)
+from datetime import datetime, timedelta, timezone
+from decouple import config
 from bson import ObjectId
-import bcrypt
-import json
-import subprocess
-from typing import List
-import traceback
-import sys
-
-
-# --- Hugging Face GPT-2 ---
-import torch
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-
-# Load GPT-2 model and tokenizer once
-gpt2_model = GPT2LMHeadModel.from_pretrained("gpt2")
-gpt2_tokenizer = GPT2Tokenizer.from_pretrained("gpt2")
-gpt2_model.eval()
-
-def generate_solution(vuln_name: str, description: str) -> str:
-    """
-    Generate a recommended solution for a vulnerability using GPT-2.
-    Falls back if GPT-2 fails to produce useful text.
-    """
-    prompt = f"Vulnerability: {vuln_name}\nDescription: {description}\nRecommended Solution:"
-    inputs = gpt2_tokenizer.encode(prompt, return_tensors="pt")
-
-    outputs = gpt2_model.generate(
-        inputs,
-        max_length=200,
-        do_sample=True,
-        temperature=0.9,
-        top_p=0.95,
-        num_return_sequences=1,
-        pad_token_id=gpt2_tokenizer.eos_token_id
-    )
-
-    solution_text = gpt2_tokenizer.decode(outputs[0], skip_special_tokens=True)
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+from typing import Optional
+from app.scan_jobs import (
+    ScanJobManager, ScanJob, parse_targets, shard_targets, normalize_profile, SCAN_BATCH_MAX_TARGETS,
+    SCAN_REUSE_MINUTES
+)
+from app.scan_events import scan_events, format_sse, TERMINAL_STATUSES
+from app.inference import (
+    try_generate_solution, fallback_solution, is_deferred, start_inference, stop_inference,
+    model_status
+)
+from app.ai_solution import hf_client, generate_ai_solutions, HF_SCAN_REMEDIATION
+from app.user_stats import get_user_stats, last_scan_at, weekly_change, top_vulnerability_types
+from app.trends import PERIODS, retrieve_trends
+from app.responses import accepted_encoding, accepts_gzip, etag_matches, json_response, make_etag, not_modified
+from app.metrics import render_metrics
+from app.exports import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_stream
 
-    # Extract only the generated part after "Recommended Solution:"
-    if "Recommended Solution:" in solution_text:
-        solution_text = solution_text.split("Recommended Solution:")[1].strip()
 
-    # Fallback if GPT-2 output is empty
-    if not solution_text:
-        solution_text = "GPT-2 could not generate a specific fix. Please review the vulnerability manually."
+logger = logging.getLogger(__name__)
 
-    return solution_text
+# Create the collection indexes at startup (disable when a migration job owns them)
+MONGO_CREATE_INDEXES = config("MONGO_CREATE_INDEXES", default=True, cast=bool)
+# How often a scan stream served by another API worker than the scan's polls for its progress
+SCAN_STREAM_POLL_SECONDS = config("SCAN_STREAM_POLL_SECONDS", default=2, cast=float)
 
 # --- FastAPI app ---
 app = FastAPI()
@@ -65,247 +53,521 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-posts = []
-
 @app.get("/", tags=["root"])
 async def read_root():
     return {"message": "Welcome to your blog!"}
 
+@app.get("/ready", tags=["root"])
+async def readiness():
+    """Report whether the API is up and whether the remediation model is loaded"""
+    return {"status": "ok", "model": model_status()}
+
+@app.get("/metrics", tags=["root"], response_class=PlainTextResponse)
+async def metrics():
+    """Pipeline, inference, database and Hugging Face metrics in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/posts", tags=["posts"])
 async def get_posts():
-    return {"data": posts}
+    return {"data": await retrieve_posts()}
 
 @app.post("/posts", dependencies=[Depends(JWTBearer())], tags=["posts"])
-async def add_post(post: PostSchema):
-    post.id = len(posts) + 1
-    posts.append(post.dict())
+async def create_post(post: PostSchema):
+    await add_post(post.dict())
     return {"data": "post added."}
 
 # --- User management ---
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
-
+# bcrypt runs in its own process pool; a full queue answers 503
 @app.post("/user/signup", tags=["user"])
-def create_user(user: UserSignupSchema = Body(...)):
-    existing_user = user_collection.find_one({"email": user.email})
+async def create_user(user: UserSignupSchema = Body(...)):
+    existing_user = await retrieve_user_by_email(user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
-    user.password = hash_password(user.password)
-    user_collection.insert_one(user.dict())
+    user.password = await password_hasher.hash(user.password)
+    try:
+        await add_user(user.dict())
+    except DuplicateKeyError:
+        # A concurrent signup with the same email got in first
+        raise HTTPException(status_code=400, detail="User already exists")
     return sign_jwt(user.email)
 
+async def rehash_password(user_id: str, password: str):
+    """Re-hash a password stored with an outdated bcrypt cost"""
+    try:
+        await update_user(user_id, {"password": await password_hasher.hash(password)})
+    except Exception as e:
+        logger.warning(f"Could not rehash password of user {user_id}: {e}")
+
 @app.post("/user/login", tags=["user"])
-def user_login(user: UserLoginSchema = Body(...)):
-    db_user = user_collection.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password"]):
+async def user_login(background_tasks: BackgroundTasks, user: UserLoginSchema = Body(...)):
+    db_user = await retrieve_user_by_email(user.email)
+    if not db_user or not await password_hasher.verify(user.password, db_user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if needs_rehash(db_user["password"]):
+        background_tasks.add_task(rehash_password, db_user["id"], user.password)
     return {"access_token": sign_jwt(user.email)["access_token"]}
 
 # --- Scan endpoint ---
-from datetime import datetime
-from bson import ObjectId
+scan_jobs = ScanJobManager(
+    try_generate_solution, defer_solution=is_deferred,
+    bulk_solution_generator=generate_ai_solutions if HF_SCAN_REMEDIATION else None
+)
+
+@app.on_event("startup")
+async def create_indexes():
+    if MONGO_CREATE_INDEXES:
+        await ensure_indexes()
+    await migrate_findings()
+
+@app.on_event("startup")
+async def start_scan_workers():
+    # Scans of stopped processes are failed by the workers' lease heartbeat
+    password_hasher.start()
+    start_inference()
+    await scan_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_scan_workers():
+    await scan_jobs.stop()
+    await stop_inference()
+    password_hasher.shutdown()
+    await hf_client.close()
+
+@app.get("/scan", status_code=202)
+async def scan(
+    target: str = Query(...),
+    tags: Optional[str] = None,
+    max_age: Optional[int] = Query(None, ge=0),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Create the scan document and enqueue the nuclei run. The scan is
+    executed by the job workers; poll GET /scan/{scan_id} for its status.
+    A target the user is already scanning with the same tags is not scanned
+    twice: the request attaches to the running scan. With max_age (minutes,
+    default SCAN_REUSE_MINUTES) the user's scan completed that recently is
+    returned instead. Other users' scans are never shared.
+    """
+    profile = normalize_profile(tags)
+    max_age = SCAN_REUSE_MINUTES if max_age is None else max_age
+    if max_age:
+        fresh_scan = await retrieve_fresh_scan(user_id, target, profile, datetime.utcnow() - timedelta(minutes=max_age))
+        if fresh_scan:
+            return {"scan_id": fresh_scan["id"], "status": fresh_scan["status"], "reused": True}
+
+    active_key = active_scan_key(user_id, target, profile)
+    for attempt in range(2):
+        scan_doc = {
+            "user_id": user_id,
+            "target": target,
+            "profile": profile,
+            "active_key": active_key,
+            "total_vulns": 0,
+            "critical": 0,
+            "high": 0,
+            "medium": 0,
+            "low": 0,
+            "status": "queued",
+            "created_at": datetime.utcnow(),
+            **scan_jobs.lease(),
+        }
+        try:
+            scan_id = str((await scan_collection.insert_one(scan_doc)).inserted_id)
+            break
+        except DuplicateKeyError:
+            active_scan = await retrieve_active_scan(active_key)
+            if active_scan:
+                return {"scan_id": active_scan["id"], "status": active_scan["status"], "attached": True}
+            # The running scan finished in between; start a new one
+    else:
+        raise HTTPException(status_code=503, detail="Target is busy, try again shortly")
+
+    try:
+        scan_jobs.submit(ScanJob(scan_id=scan_id, user_id=user_id, targets=[target], profile=profile))
+    except asyncio.QueueFull:
+        await update_scan(scan_id, {"status": "failed", "error": "Scan queue is full"},
+                          unset=["active_key", "owner", "lease_expires_at"])
+        raise HTTPException(status_code=503, detail="Too many scans queued, try again later")
 
-@app.get("/scan", response_model=List[ScanResult])
-async def scan(target: str = Query(...), user_id: str = "example_user_id"):
+    return {"scan_id": scan_id, "status": "queued"}
+
+async def submit_batch_scan(targets: list, user_id: str) -> dict:
     """
-    Run a nuclei scan, save the scan and findings to the database,
-    so that retrieve_user_scans(user_id) will return this scan.
+    Create one parent scan document for many targets and enqueue it in
+    shards, each scanned by its own nuclei process
     """
-    # --- Create a scan document first ---
+    targets = parse_targets(targets)
+    if not targets:
+        raise HTTPException(status_code=400, detail="No targets given")
+    if len(targets) > SCAN_BATCH_MAX_TARGETS:
+        raise HTTPException(status_code=400, detail=f"At most {SCAN_BATCH_MAX_TARGETS} targets per batch")
+    shards = shard_targets(targets)
+    # Held across the insert below, so concurrent requests cannot fill the queue meanwhile
+    if not scan_jobs.reserve(len(shards)):
+        raise HTTPException(status_code=503, detail="Too many scans queued, try again later")
+
     scan_doc = {
         "user_id": user_id,
-        "target": target,
+        "target": targets[0] if len(targets) == 1 else f"{len(targets)} targets",
+        "targets": targets,
         "total_vulns": 0,
         "critical": 0,
         "high": 0,
         "medium": 0,
         "low": 0,
-        "status": "running",
+        "status": "queued",
         "created_at": datetime.utcnow(),
+        "shard_count": len(shards),
+        "shards_done": 0,
+        "shards": [{"targets": len(shard), "status": "queued", "findings": 0} for shard in shards],
+        **scan_jobs.lease(),
     }
-    scan_id = scan_collection.insert_one(scan_doc).inserted_id
-
     try:
-        result = subprocess.run(
-            ["nuclei", "-u", target, "-j"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        # Mark scan as failed
-        scan_collection.update_one(
-            {"_id": scan_id},
-            {"$set": {"status": "failed"}}
-        )
-        raise HTTPException(status_code=500, detail=f"Nuclei scan failed: {e.stderr}")
-    except Exception as e:
-        traceback.print_exc(file=sys.stdout)
-        scan_collection.update_one(
-            {"_id": scan_id},
-            {"$set": {"status": "failed"}}
-        )
-        raise HTTPException(status_code=500, detail=str(e))
+        scan_id = str((await scan_collection.insert_one(scan_doc)).inserted_id)
+    except Exception:
+        scan_jobs.release(len(shards))
+        raise
+    for index, shard in enumerate(shards):
+        scan_jobs.submit(ScanJob(scan_id=scan_id, user_id=user_id, targets=shard, shard=index), reserved=True)
 
-    # --- Process results ---
-    try:
-        lines = result.stdout.strip().split("\n")
-        scan_results = []
-
-        severity_counts = {"critical": 0, "high": 0, "medium": 0, "low": 0}
-
-        for line in lines:
-            try:
-                data = json.loads(line)
-                info = data.get("info", {})
-
-                vuln = ScanResult(
-                    template_id=data.get("template"),
-                    name=info.get("name"),
-                    severity=info.get("severity"),
-                    host=data.get("host"),
-                    description=info.get("description"),
-                    matched_at=data.get("matched-at"),
-                    extracted_results=data.get("extracted-results"),
-                    curl_command=data.get("curl-command"),
-                    solution=None
-                )
-
-                vuln.solution = generate_solution(
-                    vuln.name or vuln.template_id or "Unknown",
-                    vuln.description or "No description provided"
-                )
-
-                # Count severity
-                sev = vuln.severity.lower() if vuln.severity else "low"
-                if sev in severity_counts:
-                    severity_counts[sev] += 1
-
-                # Save finding
-                add_finding({
-                    "scan_id": str(scan_id),
-                    "template_id": vuln.template_id,
-                    "name": vuln.name,
-                    "severity": vuln.severity,
-                    "host": vuln.host,
-                    "description": vuln.description,
-                    "matched_at": vuln.matched_at,
-                    "extracted_results": vuln.extracted_results,
-                    "curl_command": vuln.curl_command,
-                    "solution": vuln.solution
-                })
-
-                scan_results.append(vuln)
-
-            except Exception as e:
-                print(f"JSON parse error: {e}")
-                continue
-
-        # Update scan document with results
-        scan_collection.update_one(
-            {"_id": scan_id},
-            {
-                "$set": {
-                    "status": "completed",
-                    "total_vulns": sum(severity_counts.values()),
-                    "critical": severity_counts["critical"],
-                    "high": severity_counts["high"],
-                    "medium": severity_counts["medium"],
-                    "low": severity_counts["low"],
-                    "finished_at": datetime.utcnow()
-                }
-            }
-        )
+    return {"scan_id": scan_id, "status": "queued", "targets": len(targets), "shards": len(shards)}
 
-        return scan_results
+@app.post("/scan/batch", status_code=202)
+async def batch_scan(batch: BatchScanSchema, user_id: str = Depends(get_current_user)):
+    """Scan a list of targets; poll GET /scan/{scan_id} for per-shard progress"""
+    return await submit_batch_scan(batch.targets, user_id)
 
-    except Exception as e:
-        traceback.print_exc(file=sys.stdout)
-        scan_collection.update_one(
-            {"_id": scan_id},
-            {"$set": {"status": "failed"}}
-        )
-        raise HTTPException(status_code=500, detail="Failed to process nuclei output")
-# --- Scan history endpoint with simple timestamp-based auth ---
+@app.post("/scan/batch/file", status_code=202)
+async def batch_scan_file(file: UploadFile = File(...), user_id: str = Depends(get_current_user)):
+    """Scan the targets of an uploaded text file, one per line"""
+    content = await file.read()
+    return await submit_batch_scan(content.decode("utf-8", errors="replace").splitlines(), user_id)
 
-SECRET_KEY = "***"  # must match your JWT secret
+# --- Scan history endpoint ---
+# Largest page the list endpoints return
+MAX_PAGE_SIZE = 200
 
-def verify_token_timestamp(request: Request):
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=403, detail="Missing token")
-    try:
-        token_type, token = auth_header.split()
-        if token_type.lower() != "bearer":
-            raise HTTPException(status_code=403, detail="Invalid token")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        # Optional: check exp if you want
-    except Exception:
-        raise HTTPException(status_code=403, detail="Invalid token")
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
 @app.get("/scan/history")
-def scan_history(token: None = Depends(verify_token_timestamp)):
-    """Return all scans for the user (simplified for timestamp auth)"""
-    # For demonstration, using a fixed user_id
-    user_id = "example_user_id"
-    return retrieve_user_scans(user_id)
-# --- Dashboard endpoint ---
-def verify_token(request: Request):
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=403, detail="Missing token")
+async def scan_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Return one page of the user's scans, newest first.
+    The next page's cursor is in the X-Next-Cursor header.
+    """
     try:
-        token_type, token = auth_header.split()
-        if token_type.lower() != "bearer":
-            raise HTTPException(status_code=403, detail="Invalid token")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return payload.get("user_id")  # return user_id from token
-    except Exception:
-        raise HTTPException(status_code=403, detail="Invalid token")
+        scans, next_cursor = await retrieve_user_scans_page(
+            user_id, limit, after, projection=SCAN_SUMMARY_PROJECTION
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    set_next_cursor(response, next_cursor)
+    return scans
+
+def check_export_format(export_format: str):
+    """Reject an unknown format before any scan is looked up"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+def export_response(request: Request, scan_ids: list, export_format: str, filename: str) -> StreamingResponse:
+    """Stream the findings of the scans, gzip-compressed when the client accepts it"""
+    gzip = accepts_gzip(request)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{export_format}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    findings = iter_findings(scan_ids, batch_size=EXPORT_BATCH_SIZE)
+    return StreamingResponse(
+        export_stream(findings, export_format, gzip=gzip),
+        media_type=EXPORT_FORMATS[export_format][1],
+        headers=headers,
+    )
 
+@app.get("/scan/export")
+async def export_scans(
+    request: Request,
+    format: str = "jsonl",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    target: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Stream the findings of every scan the user started in [since, until),
+    optionally of one target, as JSON lines, CSV or SARIF. A finding seen by
+    several of those scans is exported once.
+    """
+    check_export_format(format)
+    scan_ids = await retrieve_user_scan_ids(user_id, since, until, target)
+    return export_response(request, scan_ids, format, "findings")
+
+# --- Scan status endpoints (declared after /scan/history and /scan/export so they are not shadowed) ---
+async def get_scan_or_404(scan_id: str, user_id: str) -> dict:
+    """The user's scan; other users' scans are reported as missing"""
+    if not ObjectId.is_valid(scan_id):
+        raise HTTPException(status_code=404, detail="Scan not found")
+    scan_data = await retrieve_scan(scan_id)
+    if not scan_data or scan_data["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return scan_data
+
+@app.get("/scan/{scan_id}")
+async def scan_status(scan_id: str, user_id: str = Depends(get_current_user)):
+    """Return the scan document, including its current status"""
+    return await get_scan_or_404(scan_id, user_id)
+
+@app.get("/scan/{scan_id}/findings")
+async def scan_findings(
+    scan_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    summary: bool = False,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Return the findings stored so far for a scan: all of them, or one page
+    when limit is given. summary=true leaves out the heavy fields.
+    Responses are compressed and carry an ETag; If-None-Match is answered
+    with 304 without reading the findings until the scan changes.
+    """
+    scan_data = await get_scan_or_404(scan_id, user_id)
+    # Findings grow while the scan runs, and the owner's later scans of the
+    # target re-see, reopen or resolve them
+    etag = make_etag(
+        accepted_encoding(request), scan_id, scan_data["status"], scan_data["finished_at"],
+        scan_data["total_vulns"], scan_data["solutions_generated"], await last_scan_at(scan_data["user_id"]),
+        await latest_finding_seen_at(scan_id), limit, after, summary
+    )
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+
+    projection = FINDING_SUMMARY_PROJECTION if summary else None
+    if limit is None:
+        findings = await retrieve_scan_findings(scan_id, projection=projection)
+    else:
+        try:
+            findings, next_cursor = await retrieve_scan_findings_page(scan_id, limit, after, projection)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+    return await json_response(request, findings, etag=etag, headers=headers)
+
+async def get_finding_or_404(finding_id: str, user_id: str) -> dict:
+    """A finding document of the user's, or of a scan shared with them"""
+    if not ObjectId.is_valid(finding_id):
+        raise HTTPException(status_code=404, detail="Finding not found")
+    finding = await retrieve_finding(finding_id)
+    if not finding:
+        raise HTTPException(status_code=404, detail="Finding not found")
+    if finding.get("user_id") != user_id:
+        # Findings of shared scans, and those stored before they had a user_id
+        try:
+            await get_scan_or_404(finding.get("scan_id") or "", user_id)
+        except HTTPException:
+            raise HTTPException(status_code=404, detail="Finding not found")
+    return finding
+
+@app.get("/scan/{scan_id}/export")
+async def export_scan(scan_id: str, request: Request, format: str = "jsonl",
+                      user_id: str = Depends(get_current_user)):
+    """Stream every finding of the scan as JSON lines, CSV or SARIF"""
+    check_export_format(format)
+    await get_scan_or_404(scan_id, user_id)
+    return export_response(request, [scan_id], format, f"scan-{scan_id}")
+
+@app.get("/finding/{finding_id}")
+async def finding_detail(finding_id: str, request: Request, user_id: str = Depends(get_current_user)):
+    """
+    One finding with all of its fields. Large fields are stored compressed
+    apart from the finding and only read here and by full findings listings.
+    """
+    finding = await get_finding_or_404(finding_id, user_id)
+    return await json_response(request, finding_helper(finding), headers={"Cache-Control": "private, no-cache"})
 
+@app.get("/finding/{finding_id}/solution")
+async def finding_solution(finding_id: str, user_id: str = Depends(get_current_user)):
+    """
+    The finding's recommended solution. Solutions of low-severity findings
+    are not generated during the scan; the first request generates and
+    stores it. generated is false while only a generic fallback is available.
+    """
+    finding = await get_finding_or_404(finding_id, user_id)
+    if finding.get("solution") is not None:
+        return {"id": finding_id, "solution": finding["solution"], "generated": True}
+
+    vuln_name = finding.get("name") or finding.get("template_id") or "Unknown"
+    solution = await try_generate_solution(
+        vuln_name,
+        finding.get("description") or "No description provided",
+        template_id=finding.get("template_id"),
+        severity=finding.get("severity")
+    )
+    if solution is None:
+        # Model still loading or generation failed: answer without storing anything
+        return {"id": finding_id, "solution": fallback_solution(vuln_name), "generated": False}
+
+    await update_finding_solution(finding, solution)
+    return {"id": finding_id, "solution": solution, "generated": True}
+
+@app.get("/scan/{scan_id}/diff")
+async def scan_diff(scan_id: str, against: Optional[str] = None, user_id: str = Depends(get_current_user)):
+    """
+    Compare a scan with another scan of the same target (by default the
+    previous completed one): findings that are new, fixed and unchanged.
+    """
+    scan_data = await get_scan_or_404(scan_id, user_id)
+    if against:
+        base_scan = await get_scan_or_404(against, user_id)
+        if base_scan["target"] != scan_data["target"]:
+            raise HTTPException(status_code=400, detail="Scans are of different targets")
+    else:
+        base_scan = None
+        if scan_data.get("created_at"):
+            base_scan = await retrieve_previous_scan(user_id, scan_data["target"], scan_data["created_at"])
+
+    current = await retrieve_scan_fingerprints(scan_id)
+    previous = await retrieve_scan_fingerprints(base_scan["id"]) if base_scan else {}
+    return {
+        "scan_id": scan_id,
+        "against": base_scan["id"] if base_scan else None,
+        "new": [finding for fingerprint, finding in current.items() if fingerprint not in previous],
+        "fixed": [finding for fingerprint, finding in previous.items() if fingerprint not in current],
+        "unchanged": [finding for fingerprint, finding in current.items() if fingerprint in previous],
+    }
+
+@app.get("/scan/{scan_id}/stream")
+async def scan_stream(scan_id: str, request: Request, user_id: str = Depends(get_current_user)):
+    """
+    Server-Sent Events stream of a scan: the findings stored so far, then
+    each new finding and status change as the workers produce them. Events
+    are published in the process running the scan; a stream served by
+    another API worker polls the database for them instead.
+    """
+    scan_data = await get_scan_or_404(scan_id, user_id)
+    local = scan_data.get("owner") == scan_jobs.owner
+    # Subscribe before reading the stored findings so none are missed;
+    # clients de-duplicate on the finding id.
+    queue = scan_events.subscribe(scan_id)
+
+    async def poll_scan(status: str, since: datetime):
+        """Events of a scan run by another process, from its stored state"""
+        for finding in await retrieve_scan_findings_seen_since(scan_id, since):
+            yield "finding", finding
+        current = await retrieve_scan(scan_id)
+        if current and current["status"] != status:
+            yield "status", {"status": current["status"], "error": current.get("error")}
+
+    async def event_source():
+        try:
+            polled_at = datetime.utcnow()
+            for finding in await retrieve_scan_findings(scan_id):
+                yield format_sse("finding", finding)
+            status = (await retrieve_scan(scan_id) or scan_data)["status"]
+            yield format_sse("status", {"status": status})
+            if status in TERMINAL_STATUSES:
+                return
+            idle = 0.0
+            while not await request.is_disconnected():
+                if local:
+                    try:
+                        events = [await asyncio.wait_for(queue.get(), timeout=15)]
+                    except asyncio.TimeoutError:
+                        events = []
+                    idle = 15 if not events else 0
+                else:
+                    await asyncio.sleep(SCAN_STREAM_POLL_SECONDS)
+                    # Findings are stamped before their batch is written, and clocks of
+                    # processes differ: overlap the polls (clients de-duplicate)
+                    since, polled_at = polled_at - timedelta(seconds=10), datetime.utcnow()
+                    events = [event async for event in poll_scan(status, since)]
+                    idle = idle + SCAN_STREAM_POLL_SECONDS if not events else 0
+                if not events and idle >= 15:
+                    idle = 0
+                    yield ": keep-alive\n\n"
+                for event, data in events:
+                    yield format_sse(event, data)
+                    if event == "status":
+                        status = data["status"]
+                        if status in TERMINAL_STATUSES:
+                            return
+        finally:
+            scan_events.unsubscribe(scan_id, queue)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Dashboard endpoint ---
 @app.get("/dashboard")
-def get_dashboard(token: None = Depends(verify_token_timestamp)):
-    # Fixed demo user_id (same as /scan/history)
-    user_id = "example_user_id"
-    scans = retrieve_user_scans(user_id)
+async def get_dashboard(user_id: str = Depends(get_current_user)):
+    scans = await retrieve_user_scans(user_id, limit=5, projection=SCAN_SUMMARY_PROJECTION)
+    user_stats = await get_user_stats(user_id)
     active_scan = scans[0] if scans else None
 
-    # Stats
+    # Stats, maintained incrementally as scans complete
     stats = [
         {
             "title": "Total Scans",
-            "value": str(len(scans)),
+            "value": str(user_stats.get("total_scans", 0)),
             "icon": "Activity",
             "color": "text-matrix",
-            "change": "+0%"
+            "change": weekly_change(user_stats, "scans")
         },
         {
             "title": "Total Vulnerabilities",
-            "value": str(sum(scan["total_vulns"] for scan in scans)),
+            "value": str(user_stats.get("total_vulns", 0)),
             "icon": "AlertTriangle",
             "color": "text-destructive",
-            "change": "+0%"
+            "change": weekly_change(user_stats, "vulns")
         },
     ]
 
-    # Vulnerability types (last 3 findings of latest scan)
-    vulnerability_types = []
-    if active_scan:
-        findings = retrieve_scan_findings(active_scan["id"])
-        vulnerability_types = [
-            {"type": f["name"], "severity": f["severity"], "count": 1}
-            for f in findings[:3]
-        ]
-
     return {
         "stats": stats,
-        "recentScans": scans[:5],
+        "recentScans": scans,
         "activeScan": active_scan,
-        "vulnerabilityTypes": vulnerability_types
+        "vulnerabilityTypes": top_vulnerability_types(user_stats)
     }
+
+# --- Trends endpoint ---
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; convert query parameters with an offset"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+@app.get("/trends")
+async def get_trends(
+    period: str = "day",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    target: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Critical/high/medium/low counts per target over time, from the daily or
+    weekly buckets. Defaults to the last 90 days (daily) or 52 weeks (weekly).
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(PERIODS)}")
+    since, until = naive_utc(since), naive_utc(until)
+    until = until or datetime.utcnow()
+    since = since or until - (timedelta(weeks=52) if period == "week" else timedelta(days=90))
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    buckets = await retrieve_trends(user_id, period, since, until, target)
+    return {"period": period, "since": since, "until": until, "buckets": buckets}
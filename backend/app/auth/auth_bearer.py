@@ -1,4 +1,4 @@
-from fastapi import Request, HTTPException
+from fastapi import Depends, Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .auth_handler import decode_jwt
 
@@ -12,8 +12,11 @@ class JWTBearer(HTTPBearer):
             if credentials:
                 if not credentials.scheme == "Bearer":
                     raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-                if not self.verify_jwt(credentials.credentials):
+                payload = self.decode_principal(credentials.credentials)
+                if payload is None:
                     raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+                # Decoded once per request; handlers read the principal from request.state
+                request.state.user_id = payload["user_id"]
                 return credentials.credentials
             else:
                 raise HTTPException(status_code=403, detail="Invalid authorization code.")
@@ -22,9 +25,19 @@ class JWTBearer(HTTPBearer):
         except Exception as e:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    def verify_jwt(self, jwtoken: str) -> bool:
+    def decode_principal(self, jwtoken: str):
         try:
             payload = decode_jwt(jwtoken)
-            return payload is not None and "user_id" in payload
+            return payload if payload is not None and "user_id" in payload else None
         except:
-            return False
\ No newline at end of file
+            return None
+
+    def verify_jwt(self, jwtoken: str) -> bool:
+        return self.decode_principal(jwtoken) is not None
+
+
+jwt_bearer = JWTBearer()
+
+async def get_current_user(request: Request, token: str = Depends(jwt_bearer)) -> str:
+    """Dependency returning the authenticated user's id (their email)"""
+    return request.state.user_id
\ No newline at end of file
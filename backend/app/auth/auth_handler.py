@@ -1,10 +1,17 @@
+import hashlib
 import time
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, Optional
 import jwt
 from decouple import config
 
 JWT_SECRET = config("secret")
 JWT_ALGORITHM = config("algorithm")
+# Verified tokens remembered so repeat requests skip the signature check
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+
+# sha256(token) -> decoded payload, least recently used first
+_verified_tokens: "OrderedDict[bytes, dict]" = OrderedDict()
 
 def token_response(token: str):
     return {
@@ -19,10 +26,25 @@ def sign_jwt(user_id: str) -> Dict[str, str]:
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token_response(token)
 
-def decode_jwt(token: str) -> dict:
+def decode_jwt(token: str) -> Optional[dict]:
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        if cached["expires"] >= time.time():
+            _verified_tokens.move_to_end(digest)
+            return cached
+        del _verified_tokens[digest]
+        return None
+
     try:
         decoded_token = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         # Check if token is expired using your custom 'expires' field
-        return decoded_token if decoded_token["expires"] >= time.time() else None
+        if decoded_token["expires"] < time.time():
+            return None
     except:
-        return None
\ No newline at end of file
+        return None
+
+    _verified_tokens[digest] = decoded_token
+    if len(_verified_tokens) > TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return decoded_token
\ No newline at end of file
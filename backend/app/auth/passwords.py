@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+from decouple import config
+from fastapi import HTTPException
+
+from app.metrics import password_hash_seconds, password_hash_pending, password_hash_rejected_total
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes; stored hashes with another cost are
+# re-hashed on the next successful login
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
+# Processes dedicated to hashing, so logins never take the shared threadpool
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+# Hashes queued or running before new ones are rejected with 503
+PASSWORD_HASH_QUEUE_SIZE = config("PASSWORD_HASH_QUEUE_SIZE", default=64, cast=int)
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash such as $2b$12$..., None if unparseable"""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt; queue depth and latency go to /metrics."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+
+    def start(self):
+        """Create the pool at startup rather than on the first login"""
+        self._get_executor()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # Workers come from a clean forkserver process, not forked from the
+            # API's, which by then runs motor's and the model's threads
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.executor
+
+    async def _run(self, operation: str, fn, *args):
+        if self.pending >= self.queue_size:
+            password_hash_rejected_total.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        password_hash_pending.set(self.pending)
+        started = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # Concurrent callers see the same broken pool; only the first replaces it
+                if self.executor is executor:
+                    logger.error("Password hashing pool died, restarting it")
+                    self.shutdown()
+                return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            password_hash_pending.set(self.pending)
+            password_hash_seconds.observe(time.perf_counter() - started, operation=operation)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run("hash", _hash, password.encode("utf-8"), BCRYPT_ROUNDS)
+        return hashed.decode("utf-8")
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _check, plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,38 @@
+"""
+Compression of large finding fields stored outside the findings collection.
+zstd is used when the zstandard package is installed, zlib otherwise; the
+codec is stored with the data so either can be read back.
+"""
+import json
+import zlib
+
+try:
+    import zstandard  # optional: pip install zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+
+def compress_value(value, codec: str = DEFAULT_CODEC) -> bytes:
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def decompress_value(data: bytes, codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed finding details")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    return json.loads(raw)
+
+
+def encoded_size(value) -> int:
+    """Size in bytes a field takes inline, near enough to compare with a threshold"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, separators=(",", ":")).encode("utf-8"))
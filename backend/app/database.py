@@ -1,19 +1,141 @@
-from pymongo.mongo_client import MongoClient
+import base64
+import json
+import logging
+from collections import defaultdict
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, PyMongoError
 from pymongo.server_api import ServerApi
 from bson.objectid import ObjectId
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from decouple import config
+from app.compression import DEFAULT_CODEC, compress_value, decompress_value, encoded_size
+from app.fingerprint import document_fingerprint
+from app.metrics import instrument_mongo
 
 uri = "*****"
 
-# Connect to MongoDB Atlas
-client = MongoClient(uri, server_api=ServerApi('1'))
+# Connection string; overrides the Atlas uri above. "mongomock://" uses an
+# in-memory stand-in (pip install mongomock-motor), e.g. for benchmarks
+MONGO_URI = config("MONGO_URI", default=uri)
+MONGO_DB_NAME = config("MONGO_DB_NAME", default="user")
+
+# Connection pool shared by every request and scan worker. Motor does not
+# block the event loop, so the pool, not a thread pool, bounds concurrency.
+MONGO_MAX_POOL_SIZE = config("MONGO_MAX_POOL_SIZE", default=200, cast=int)
+MONGO_MIN_POOL_SIZE = config("MONGO_MIN_POOL_SIZE", default=10, cast=int)
+MONGO_MAX_IDLE_TIME_MS = config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int)
+# How long a request waits for a free connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = config("MONGO_WAIT_QUEUE_TIMEOUT_MS", default=5000, cast=int)
+# Finding fields larger than this many bytes are compressed into the
+# finding_details collection instead of the finding (0 keeps them inline)
+FINDING_DETAIL_THRESHOLD = config("FINDING_DETAIL_THRESHOLD", default=1024, cast=int)
+
+if MONGO_URI.startswith("mongomock://"):
+    from mongomock_motor import AsyncMongoMockClient
+    client = AsyncMongoMockClient()
+else:
+    # Connect to MongoDB Atlas
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        server_api=ServerApi('1'),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        retryWrites=True,
+    )
 
 # Choose your database and collections
-database = client["user"]  # database name
+database = client[MONGO_DB_NAME]  # database name
 user_collection = database["users"]  # collection name
 scan_collection = database["scans"]  # new collection for scan history
 finding_collection = database["findings"]  # new collection for vulnerability findings
+solution_collection = database["solutions"]  # generated solutions cached by template
+user_stats_collection = database["user_stats"]  # per-user dashboard counters
+finding_details_collection = database["finding_details"]  # compressed large finding fields
+post_collection = database["posts"]  # blog posts, shared by every API worker
+counter_collection = database["counters"]  # sequential ids
+trend_collection = database["trends"]  # per-target daily and weekly vulnerability rollups
+
+# Severities counted on scan documents and statistics
+SEVERITY_LEVELS = ("critical", "high", "medium", "low")
+
+logger = logging.getLogger(__name__)
+
+# Indexes backing the helper queries below, created by ensure_indexes()
+INDEXES = [
+    (user_collection, [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ]),
+    (scan_collection, [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="user_id_created_at_id"),
+        # At most one queued or running scan per target and template profile;
+        # active_key is removed when the scan finishes
+        IndexModel([("active_key", ASCENDING)], name="active_key_unique", unique=True,
+                   partialFilterExpression={"active_key": {"$exists": True}}),
+        IndexModel([("user_id", ASCENDING), ("target", ASCENDING), ("profile", ASCENDING),
+                    ("finished_at", DESCENDING)],
+                   name="user_id_target_profile_finished_at"),
+        # Leases of unfinished scans: renewed by the owning process, reaped once expired
+        IndexModel([("owner", ASCENDING)], name="owner",
+                   partialFilterExpression={"owner": {"$exists": True}}),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+    ]),
+    (finding_collection, [
+        # A finding is stored once per target and lists every scan it was seen in
+        IndexModel([("scan_ids", ASCENDING), ("severity", ASCENDING)], name="scan_ids_severity"),
+        IndexModel([("scan_ids", ASCENDING), ("_id", ASCENDING)], name="scan_ids_id"),
+        # Findings stored or re-seen lately, for streams of scans run by another process
+        IndexModel([("scan_ids", ASCENDING), ("last_seen_at", ASCENDING)], name="scan_ids_last_seen_at"),
+        IndexModel([("user_id", ASCENDING), ("target", ASCENDING), ("fingerprint", ASCENDING)],
+                   name="user_id_target_fingerprint", unique=True,
+                   partialFilterExpression={"fingerprint": {"$exists": True}}),
+    ]),
+    (trend_collection, [
+        # One bucket per user, period, target and bucket start; serves /trends range queries
+        IndexModel([("user_id", ASCENDING), ("period", ASCENDING), ("target", ASCENDING), ("start", ASCENDING)],
+                   name="user_id_period_target_start", unique=True),
+    ]),
+]
+
+async def ensure_indexes() -> bool:
+    """Create the indexes in INDEXES. Idempotent; returns False if any failed."""
+    ok = True
+    for collection, indexes in INDEXES:
+        try:
+            await collection.create_indexes(indexes)
+        except PyMongoError as e:
+            ok = False
+            logger.error(f"Failed to create indexes on {collection.name}: {str(e)}")
+    return ok
+
+async def migrate_findings():
+    """Give findings stored before delta rescans the scan_ids list they are queried by"""
+    result = await finding_collection.update_many(
+        {"scan_ids": {"$exists": False}}, [{"$set": {"scan_ids": ["$scan_id"]}}]
+    )
+    if result.modified_count:
+        logger.info(f"Added scan_ids to {result.modified_count} findings")
+
+# Keyset pagination cursors: the sort key values of the last returned document
+def encode_cursor(*values) -> str:
+    raw = json.dumps([
+        value.isoformat() if isinstance(value, datetime) else str(value) for value in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> list:
+    """Decode a cursor into its raw string values. Raises ValueError if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
 
 # User helpers
 def user_helper(user) -> dict:
@@ -25,41 +147,73 @@ def user_helper(user) -> dict:
         "password": user.get("password")
     }
 
-def retrieve_users():
+@instrument_mongo
+async def retrieve_users():
     users = []
-    for user in user_collection.find():
+    async for user in user_collection.find():
         users.append(user_helper(user))
     return users
 
-def add_user(user_data: dict) -> dict:
-    result = user_collection.insert_one(user_data)
-    new_user = user_collection.find_one({"_id": result.inserted_id})
-    return user_helper(new_user)
+@instrument_mongo
+async def add_user(user_data: dict) -> dict:
+    result = await user_collection.insert_one(user_data)
+    return user_helper({**user_data, "_id": result.inserted_id})
 
-def retrieve_user(id: str) -> dict | None:
-    user = user_collection.find_one({"_id": ObjectId(id)})
+@instrument_mongo
+async def retrieve_user(id: str) -> dict | None:
+    user = await user_collection.find_one({"_id": ObjectId(id)})
     if user:
         return user_helper(user)
     return None
 
 # ADD THIS MISSING FUNCTION:
-def retrieve_user_by_email(email: str) -> dict | None:
+@instrument_mongo
+async def retrieve_user_by_email(email: str) -> dict | None:
     """Retrieve user by email address"""
-    user = user_collection.find_one({"email": email})
+    user = await user_collection.find_one({"email": email})
     if user:
         return user_helper(user)
     return None
 
-def update_user(id: str, data: dict) -> bool:
+@instrument_mongo
+async def update_user(id: str, data: dict) -> bool:
     if not data:
         return False
-    result = user_collection.update_one({"_id": ObjectId(id)}, {"$set": data})
+    result = await user_collection.update_one({"_id": ObjectId(id)}, {"$set": data})
     return result.modified_count > 0
 
-def delete_user(id: str) -> bool:
-    result = user_collection.delete_one({"_id": ObjectId(id)})
+@instrument_mongo
+async def delete_user(id: str) -> bool:
+    result = await user_collection.delete_one({"_id": ObjectId(id)})
     return result.deleted_count > 0
 
+# Post helpers
+def post_helper(post) -> dict:
+    return {
+        "id": post["_id"],
+        "title": post.get("title"),
+        "content": post.get("content")
+    }
+
+@instrument_mongo
+async def next_sequence(name: str) -> int:
+    """Next value of a named counter, unique across API workers"""
+    counter = await counter_collection.find_one_and_update(
+        {"_id": name}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+@instrument_mongo
+async def retrieve_posts() -> List[dict]:
+    return [post_helper(post) async for post in post_collection.find().sort("_id", ASCENDING)]
+
+@instrument_mongo
+async def add_post(post_data: dict) -> dict:
+    post = {**post_data, "_id": await next_sequence("posts")}
+    post.pop("id", None)
+    await post_collection.insert_one(post)
+    return post_helper(post)
+
 # Scan history helpers
 def scan_helper(scan) -> dict:
     return {
@@ -76,27 +230,165 @@ def scan_helper(scan) -> dict:
         "date": scan.get("date", datetime.now().strftime("%Y-%m-%d")),
         "time": scan.get("time", datetime.now().strftime("%H:%M:%S")),
         "duration": scan.get("duration", "Unknown"),
-        "score": scan.get("score", 0)
+        "score": scan.get("score", 0),
+        "error": scan.get("error"),
+        "new_vulns": scan.get("new_vulns", 0),
+        "unchanged_vulns": scan.get("unchanged_vulns", 0),
+        "resolved_vulns": scan.get("resolved_vulns", 0),
+        "created_at": scan.get("created_at"),
+        "finished_at": scan.get("finished_at"),
+        "deferred_solutions": scan.get("deferred_solutions", 0),
+        "solutions_generated": scan.get("solutions_generated", 0),
+        "shards": scan.get("shards"),
+        "profile": scan.get("profile", ""),
+        "timings": scan.get("timings")
     }
 
-def add_scan(scan_data: dict) -> dict:
+@instrument_mongo
+async def add_scan(scan_data: dict) -> dict:
     scan_data["created_at"] = datetime.now()
-    result = scan_collection.insert_one(scan_data)
-    new_scan = scan_collection.find_one({"_id": result.inserted_id})
-    return scan_helper(new_scan)
-
-def retrieve_user_scans(user_id: str) -> List[dict]:
-    scans = []
-    for scan in scan_collection.find({"user_id": user_id}).sort("created_at", -1):
-        scans.append(scan_helper(scan))
-    return scans
-
-def retrieve_scan(scan_id: str) -> dict | None:
-    scan = scan_collection.find_one({"_id": ObjectId(scan_id)})
+    result = await scan_collection.insert_one(scan_data)
+    return scan_helper({**scan_data, "_id": result.inserted_id})
+
+# Newest first; _id breaks ties so keyset pagination is stable
+USER_SCANS_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+# Fields of scan_helper, for list views that must not pull large scan documents
+SCAN_SUMMARY_PROJECTION = {field: 1 for field in (
+    "target", "user_id", "total_vulns", "critical", "high", "medium", "low", "scan_time",
+    "status", "date", "time", "duration", "score", "error", "new_vulns", "unchanged_vulns",
+    "resolved_vulns", "created_at", "finished_at", "deferred_solutions", "solutions_generated", "shards", "profile", "timings"
+)}
+
+@instrument_mongo
+async def retrieve_user_scans(user_id: str, limit: Optional[int] = None,
+                              projection: Optional[dict] = None) -> List[dict]:
+    cursor = scan_collection.find({"user_id": user_id}, projection).sort(USER_SCANS_SORT)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [scan_helper(scan) async for scan in cursor]
+
+@instrument_mongo
+async def retrieve_user_scan_ids(user_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                 target: Optional[str] = None) -> List[str]:
+    """Ids of the user's scans created in [since, until), newest first"""
+    query: Dict[str, Any] = {"user_id": user_id}
+    created_at = {}
+    if since:
+        created_at["$gte"] = since
+    if until:
+        created_at["$lt"] = until
+    if created_at:
+        query["created_at"] = created_at
+    if target:
+        query["target"] = target
+    cursor = scan_collection.find(query, {"_id": 1}).sort(USER_SCANS_SORT)
+    return [str(scan["_id"]) async for scan in cursor]
+
+@instrument_mongo
+async def retrieve_user_scans_page(user_id: str, limit: int, after: Optional[str] = None,
+                                   projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a user's scans, newest first. Returns the scans and the
+    cursor of the next page (None on the last page).
+    """
+    query = {"user_id": user_id}
+    if after:
+        created_at, scan_id = decode_cursor(after)
+        try:
+            created_at, scan_id = datetime.fromisoformat(created_at), ObjectId(scan_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": scan_id}},
+        ]
+
+    cursor = scan_collection.find(query, projection).sort(USER_SCANS_SORT).limit(limit + 1)
+    scans = await cursor.to_list(length=limit + 1)
+    next_cursor = None
+    if len(scans) > limit:
+        scans = scans[:limit]
+        next_cursor = encode_cursor(scans[-1]["created_at"], scans[-1]["_id"])
+    return [scan_helper(scan) for scan in scans], next_cursor
+
+@instrument_mongo
+async def retrieve_scan(scan_id: str) -> dict | None:
+    scan = await scan_collection.find_one({"_id": ObjectId(scan_id)})
+    if scan:
+        return scan_helper(scan)
+    return None
+
+@instrument_mongo
+async def update_scan(scan_id: str, data: dict, unset: Optional[List[str]] = None) -> bool:
+    update = {"$set": data}
+    if unset:
+        update["$unset"] = {name: "" for name in unset}
+    result = await scan_collection.update_one({"_id": ObjectId(scan_id)}, update)
+    return result.modified_count > 0
+
+# Scan coalescing: a user's requests for a target they are already scanning
+# share that scan. Scans are never shared between users.
+def active_scan_key(user_id: str, target: str, profile: str) -> str:
+    return f"{user_id}|{profile}|{target}"
+
+@instrument_mongo
+async def retrieve_active_scan(active_key: str) -> dict | None:
+    scan = await scan_collection.find_one({"active_key": active_key})
+    if scan:
+        return scan_helper(scan)
+    return None
+
+@instrument_mongo
+async def retrieve_fresh_scan(user_id: str, target: str, profile: str, since: datetime) -> dict | None:
+    """The user's latest scan of a target with this template profile completed after `since`"""
+    scan = await scan_collection.find_one(
+        {"user_id": user_id, "target": target, "profile": profile, "finished_at": {"$gte": since},
+         "status": "completed"},
+        sort=[("finished_at", DESCENDING)]
+    )
     if scan:
         return scan_helper(scan)
     return None
 
+@instrument_mongo
+async def renew_scan_leases(owner: str, expires_at: datetime) -> int:
+    """Extend the leases of the unfinished scans a process owns"""
+    result = await scan_collection.update_many(
+        {"owner": owner, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"lease_expires_at": expires_at}}
+    )
+    return result.modified_count
+
+@instrument_mongo
+async def fail_interrupted_scans() -> int:
+    """
+    Fail queued or running scans whose lease has expired: the process that
+    owned their jobs is gone. Scans of live processes keep renewing theirs.
+    """
+    now = datetime.utcnow()
+    result = await scan_collection.update_many(
+        # Scans stored before leases have none and are reaped too
+        {"status": {"$in": ["queued", "running"]}, "lease_expires_at": {"$not": {"$gte": now}}},
+        {"$set": {"status": "failed", "error": "Scan interrupted", "finished_at": now},
+         "$unset": {"active_key": "", "owner": "", "lease_expires_at": ""}}
+    )
+    return result.modified_count
+
+@instrument_mongo
+async def increment_scan_counters(scan_id: str, increments: dict):
+    await scan_collection.update_one({"_id": ObjectId(scan_id)}, {"$inc": increments})
+
+@instrument_mongo
+async def finish_scan_shard(scan_id: str, shard: int, fields: dict) -> dict:
+    """Record a finished shard of a batch scan; returns the updated scan document"""
+    return await scan_collection.find_one_and_update(
+        {"_id": ObjectId(scan_id)},
+        {"$set": {f"shards.{shard}.{name}": value for name, value in fields.items()}, "$inc": {"shards_done": 1}},
+        projection={"shard_count": 1, "shards_done": 1, "shards.status": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
 # Vulnerability findings helpers
 def finding_helper(finding) -> dict:
     return {
@@ -110,17 +402,293 @@ def finding_helper(finding) -> dict:
         "matched_at": finding.get("matched_at"),
         "extracted_results": finding.get("extracted_results"),
         "curl_command": finding.get("curl_command"),
-        "solution": finding.get("solution")
+        "solution": finding.get("solution"),
+        "fingerprint": finding.get("fingerprint"),
+        "status": finding.get("status", "open"),
+        "offloaded": finding.get("offloaded", [])
+    }
+
+# Large finding fields: stored compressed in finding_details, keyed by the
+# finding's _id, and listed in the finding's `offloaded` field
+DETAIL_FIELDS = ("curl_command", "extracted_results", "solution")
+
+def offload_detail_fields(finding: dict) -> Tuple[dict, Optional[dict]]:
+    """The compact document to store for a finding, and its details document if any field was moved"""
+    if FINDING_DETAIL_THRESHOLD <= 0:
+        return finding, None
+    heavy = [
+        name for name in DETAIL_FIELDS
+        if finding.get(name) is not None and encoded_size(finding[name]) > FINDING_DETAIL_THRESHOLD
+    ]
+    if not heavy:
+        return finding, None
+    document = {name: value for name, value in finding.items() if name not in heavy}
+    document["offloaded"] = heavy
+    details = {
+        "_id": finding["_id"],
+        "codec": DEFAULT_CODEC,
+        "fields": {name: compress_value(finding[name], DEFAULT_CODEC) for name in heavy},
     }
+    return document, details
+
+async def _add_finding_details(details: List[dict]):
+    if not details:
+        return
+    try:
+        await finding_details_collection.insert_many(details, ordered=False)
+    except BulkWriteError as e:
+        # Details written by an earlier attempt of the same batch are fine
+        errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if errors:
+            raise
+
+@instrument_mongo
+async def load_finding_details(finding_ids: List[ObjectId]) -> Dict[ObjectId, dict]:
+    """Finding _id -> its offloaded fields, decompressed"""
+    if not finding_ids:
+        return {}
+    details = {}
+    async for document in finding_details_collection.find({"_id": {"$in": finding_ids}}):
+        details[document["_id"]] = {
+            name: decompress_value(data, document.get("codec", "zlib"))
+            for name, data in document["fields"].items()
+        }
+    return details
+
+async def hydrate_findings(findings: List[dict]) -> List[dict]:
+    """Put the offloaded fields back into finding documents, with one query for all of them"""
+    details = await load_finding_details([finding["_id"] for finding in findings if finding.get("offloaded")])
+    for finding in findings:
+        finding.update(details.get(finding["_id"], {}))
+    return findings
+
+@instrument_mongo
+async def add_finding(finding_data: dict) -> dict:
+    finding_data.setdefault("_id", ObjectId())
+    document, details = offload_detail_fields(finding_data)
+    await finding_collection.insert_one(document)
+    await _add_finding_details([details] if details else [])
+    return finding_helper(finding_data)
+
+@instrument_mongo
+async def add_findings(findings: List[dict]) -> List[dict]:
+    """
+    Insert findings in one unordered batch. Documents without an _id get one.
+    Raises pymongo's BulkWriteError listing the documents that failed.
+    The findings passed in keep every field; large ones are stored apart.
+    """
+    documents, details = [], []
+    for finding in findings:
+        finding.setdefault("_id", ObjectId())
+        document, finding_details = offload_detail_fields(finding)
+        documents.append(document)
+        if finding_details:
+            details.append(finding_details)
+    if documents:
+        try:
+            await finding_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {documents[error["index"]]["_id"] for error in e.details.get("writeErrors", [])}
+            await _add_finding_details([d for d in details if d["_id"] not in failed])
+            raise
+        await _add_finding_details(details)
+    return [finding_helper(finding) for finding in findings]
+
+# Fields list views need; the heavy curl_command, extracted_results and
+# solution are only loaded for a finding's detail
+FINDING_SUMMARY_PROJECTION = {field: 1 for field in (
+    "scan_id", "template_id", "name", "severity", "host", "matched_at", "fingerprint", "status", "offloaded"
+)}
+
+@instrument_mongo
+async def retrieve_finding(finding_id: str) -> dict | None:
+    """One finding with all of its fields, including offloaded ones"""
+    finding = await finding_collection.find_one({"_id": ObjectId(finding_id)})
+    if not finding:
+        return None
+    await hydrate_findings([finding])
+    return finding
 
-def add_finding(finding_data: dict) -> dict:
-    result = finding_collection.insert_one(finding_data)
-    new_finding = finding_collection.find_one({"_id": result.inserted_id})
-    return finding_helper(new_finding)
+@instrument_mongo
+async def retrieve_scan_findings(scan_id: str, limit: Optional[int] = None,
+                                 projection: Optional[dict] = None) -> List[dict]:
+    cursor = finding_collection.find({"scan_ids": scan_id}, projection).sort("_id", ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    findings = await cursor.to_list(length=None)
+    if projection is None:
+        await hydrate_findings(findings)
+    return [finding_helper(finding) for finding in findings]
+
+@instrument_mongo
+async def retrieve_scan_findings_page(scan_id: str, limit: int, after: Optional[str] = None,
+                                      projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of a scan's findings in insertion order, and the next page's cursor"""
+    query = {"scan_ids": scan_id}
+    if after:
+        (finding_id,) = decode_cursor(after)
+        if not ObjectId.is_valid(finding_id):
+            raise ValueError("Invalid cursor")
+        query["_id"] = {"$gt": ObjectId(finding_id)}
+
+    cursor = finding_collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1)
+    findings = await cursor.to_list(length=limit + 1)
+    next_cursor = None
+    if len(findings) > limit:
+        findings = findings[:limit]
+        next_cursor = encode_cursor(findings[-1]["_id"])
+    if projection is None:
+        await hydrate_findings(findings)
+    return [finding_helper(finding) for finding in findings], next_cursor
+
+async def iter_findings(scan_ids: List[str], batch_size: int) -> AsyncIterator[dict]:
+    """
+    Every finding of the given scans (once each, even if seen by several),
+    with offloaded fields loaded back. Reads batch_size documents at a time
+    so memory does not grow with the number of findings.
+    """
+    cursor = finding_collection.find({"scan_ids": {"$in": scan_ids}}).sort("_id", ASCENDING).batch_size(batch_size)
+    batch = []
+    async for finding in cursor:
+        batch.append(finding)
+        if len(batch) >= batch_size:
+            for hydrated in await hydrate_findings(batch):
+                yield finding_helper(hydrated)
+            batch = []
+    for hydrated in await hydrate_findings(batch):
+        yield finding_helper(hydrated)
+
+@instrument_mongo
+async def retrieve_scan_findings_seen_since(scan_id: str, since: datetime) -> List[dict]:
+    """The scan's findings stored or tagged with it at or after `since`"""
+    cursor = finding_collection.find({"scan_ids": scan_id, "last_seen_at": {"$gte": since}}).sort("last_seen_at", ASCENDING)
+    findings = await cursor.to_list(length=None)
+    await hydrate_findings(findings)
+    return [finding_helper(finding) for finding in findings]
+
+@instrument_mongo
+async def latest_finding_seen_at(scan_id: str) -> Optional[datetime]:
+    """When a finding was last stored, re-seen or reopened with this scan"""
+    finding = await finding_collection.find_one(
+        {"scan_ids": scan_id}, {"last_seen_at": 1}, sort=[("last_seen_at", DESCENDING)]
+    )
+    return (finding or {}).get("last_seen_at")
+
+@instrument_mongo
+async def retrieve_unsolved_findings(scan_id: str, targets: Optional[List[str]] = None) -> List[dict]:
+    """The scan's findings (of the given targets) still without a solution, with the fields a prompt needs"""
+    query = {"scan_ids": scan_id, "solution": None, "offloaded": {"$ne": "solution"}}
+    if targets:
+        query["target"] = {"$in": targets}
+    projection = {field: 1 for field in ("scan_id", "scan_ids", "template_id", "name", "description", "severity")}
+    return await finding_collection.find(query, projection).to_list(length=None)
+
+@instrument_mongo
+async def update_finding_solution(finding: dict, solution: str):
+    """
+    Store a solution generated on demand, offloading it like add_findings
+    would, and bump the finding's scans so cached listings are refetched
+    """
+    finding_id = finding["_id"]
+    if FINDING_DETAIL_THRESHOLD > 0 and encoded_size(solution) > FINDING_DETAIL_THRESHOLD:
+        existing = await finding_details_collection.find_one({"_id": finding_id}, {"codec": 1})
+        codec = existing.get("codec", "zlib") if existing else DEFAULT_CODEC
+        await finding_details_collection.update_one(
+            {"_id": finding_id},
+            {"$set": {"fields.solution": compress_value(solution, codec)}, "$setOnInsert": {"codec": codec}},
+            upsert=True
+        )
+        update = {"$addToSet": {"offloaded": "solution"}, "$unset": {"solution": ""}}
+    else:
+        update = {"$set": {"solution": solution}}
+    await finding_collection.update_one({"_id": finding_id}, update)
+
+    scan_ids = [ObjectId(scan_id) for scan_id in finding.get("scan_ids") or [finding.get("scan_id")]
+                if scan_id and ObjectId.is_valid(scan_id)]
+    if scan_ids:
+        await scan_collection.update_many({"_id": {"$in": scan_ids}}, {"$inc": {"solutions_generated": 1}})
+
+# Delta rescans: findings are identified per (user, target) by their fingerprint
+@instrument_mongo
+async def retrieve_known_findings(user_id: str, targets: List[str]) -> Dict[Tuple[str, str], dict]:
+    """(target, fingerprint) -> solution and status of every finding previously stored for the targets"""
+    cursor = finding_collection.find(
+        {"user_id": user_id, "target": {"$in": targets}, "fingerprint": {"$exists": True}},
+        {"target": 1, "fingerprint": 1, "solution": 1, "status": 1, "offloaded": 1}
+    )
+    findings = await cursor.to_list(length=None)
+    # Only the solution is needed from the details
+    offloaded = [finding["_id"] for finding in findings if "solution" in finding.get("offloaded", [])]
+    details = await load_finding_details(offloaded)
+    for finding in findings:
+        if finding["_id"] in details:
+            finding["solution"] = details[finding["_id"]].get("solution")
+    return {(finding["target"], finding["fingerprint"]): finding for finding in findings}
+
+@instrument_mongo
+async def mark_findings_seen(user_id: str, scan_id: str, seen: List[Tuple[str, str]]):
+    """Add a scan to already stored (target, fingerprint) findings, reopening resolved ones"""
+    if not seen:
+        return
+    by_target = defaultdict(list)
+    for target, fingerprint in seen:
+        by_target[target].append(fingerprint)
+    await finding_collection.update_many(
+        {"user_id": user_id, "$or": [
+            {"target": target, "fingerprint": {"$in": fingerprints}}
+            for target, fingerprints in by_target.items()
+        ]},
+        {
+            "$addToSet": {"scan_ids": scan_id},
+            "$set": {"status": "open", "last_seen_at": datetime.utcnow()},
+            "$unset": {"resolved_at": "", "resolved_in_scan": ""},
+        }
+    )
+
+@instrument_mongo
+async def retrieve_findings_by_fingerprint(user_id: str, pairs: List[Tuple[str, str]]) -> List[dict]:
+    """Stored findings of the user matching (target, fingerprint) pairs, with all of their fields"""
+    if not pairs:
+        return []
+    by_target = defaultdict(list)
+    for target, fingerprint in pairs:
+        by_target[target].append(fingerprint)
+    findings = await finding_collection.find({"user_id": user_id, "$or": [
+        {"target": target, "fingerprint": {"$in": fingerprints}}
+        for target, fingerprints in by_target.items()
+    ]}).to_list(length=None)
+    await hydrate_findings(findings)
+    return [finding_helper(finding) for finding in findings]
+
+@instrument_mongo
+async def resolve_missing_findings(user_id: str, targets: List[str], scan_id: str) -> int:
+    """Mark the targets' open findings that this scan did not see as resolved"""
+    result = await finding_collection.update_many(
+        {
+            "user_id": user_id, "target": {"$in": targets}, "status": "open",
+            "fingerprint": {"$exists": True}, "scan_ids": {"$ne": scan_id},
+        },
+        {"$set": {"status": "resolved", "resolved_at": datetime.utcnow(), "resolved_in_scan": scan_id}}
+    )
+    return result.modified_count
+
+@instrument_mongo
+async def retrieve_previous_scan(user_id: str, target: str, created_at: datetime) -> dict | None:
+    """The user's latest completed scan of a target before the given time"""
+    scan = await scan_collection.find_one(
+        {"user_id": user_id, "target": target, "status": "completed", "created_at": {"$lt": created_at}},
+        sort=USER_SCANS_SORT
+    )
+    if scan:
+        return scan_helper(scan)
+    return None
 
-def retrieve_scan_findings(scan_id: str) -> List[dict]:
-    findings = []
-    for finding in finding_collection.find({"scan_id": scan_id}):
-        findings.append(finding_helper(finding))
+@instrument_mongo
+async def retrieve_scan_fingerprints(scan_id: str) -> Dict[str, dict]:
+    """Fingerprint -> summary of every finding seen in a scan"""
+    projection = {**FINDING_SUMMARY_PROJECTION, "extracted_results": 1}
+    findings = {}
+    async for finding in finding_collection.find({"scan_ids": scan_id}, projection):
+        finding["fingerprint"] = document_fingerprint(finding)
+        findings[finding["fingerprint"]] = finding_helper(finding)
     return findings
-    
@@ -0,0 +1,126 @@
+"""
+Streaming exports of findings as JSON lines, CSV or SARIF 2.1.0. Rows are
+encoded one finding at a time and sent in chunks (gzip-compressed on the
+fly when requested), so memory stays flat however many findings a scan has.
+"""
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Dict
+
+from decouple import config
+
+from app.responses import dumps
+
+# Findings read from MongoDB per round trip
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", default=1000, cast=int)
+# Encoded rows are sent (and compressed) in chunks of about this size
+EXPORT_CHUNK_BYTES = config("EXPORT_CHUNK_BYTES", default=64 * 1024, cast=int)
+
+CSV_COLUMNS = (
+    "id", "scan_id", "template_id", "name", "severity", "status", "host", "matched_at",
+    "description", "extracted_results", "curl_command", "solution", "fingerprint"
+)
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {"critical": "error", "high": "error", "medium": "warning", "low": "note", "info": "note"}
+
+
+async def jsonl_rows(findings: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for finding in findings:
+        finding.pop("offloaded", None)
+        yield dumps(finding) + b"\n"
+
+
+async def csv_rows(findings: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for finding in findings:
+        extracted = finding.get("extracted_results")
+        if isinstance(extracted, list):
+            finding["extracted_results"] = "\n".join(str(value) for value in extracted)
+        writer.writerow([finding.get(column) if finding.get(column) is not None else "" for column in CSV_COLUMNS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def sarif_result(finding: dict) -> dict:
+    location = finding.get("matched_at") or finding.get("host") or ""
+    result = {
+        "ruleId": finding.get("template_id") or "unknown",
+        "level": SARIF_LEVELS.get((finding.get("severity") or "").lower(), "none"),
+        "message": {"text": finding.get("name") or finding.get("template_id") or "Finding"},
+        "locations": [{"physicalLocation": {"artifactLocation": {"uri": location}}}],
+        "properties": {
+            "severity": finding.get("severity"),
+            "status": finding.get("status"),
+            "scanId": finding.get("scan_id"),
+        },
+    }
+    if finding.get("fingerprint"):
+        result["partialFingerprints"] = {"nucleiFinding/v1": finding["fingerprint"]}
+    if finding.get("solution"):
+        result["fixes"] = [{"description": {"text": finding["solution"]}}]
+    return result
+
+
+async def sarif_rows(findings: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """
+    One SARIF log with a single nuclei run. Results are streamed first; the
+    rules, one per template seen, follow them in the run object.
+    """
+    rules: Dict[str, dict] = {}
+    yield f'{{"version":"2.1.0","$schema":"{SARIF_SCHEMA}","runs":[{{"results":['.encode("utf-8")
+    separator = b""
+    async for finding in findings:
+        result = sarif_result(finding)
+        if result["ruleId"] not in rules:
+            rules[result["ruleId"]] = {
+                "id": result["ruleId"],
+                "name": finding.get("name") or result["ruleId"],
+                "shortDescription": {"text": finding.get("name") or result["ruleId"]},
+                "fullDescription": {"text": finding.get("description") or ""},
+                "properties": {"severity": finding.get("severity")},
+            }
+        yield separator + dumps(result)
+        separator = b","
+    tool = {"driver": {"name": "nuclei", "informationUri": "https://github.com/projectdiscovery/nuclei",
+                       "rules": list(rules.values())}}
+    yield b'],"tool":' + dumps(tool) + b"}]}"
+
+
+EXPORT_FORMATS = {
+    "jsonl": (jsonl_rows, "application/x-ndjson"),
+    "csv": (csv_rows, "text/csv; charset=utf-8"),
+    "sarif": (sarif_rows, "application/sarif+json"),
+}
+
+
+async def chunked(rows: AsyncIterator[bytes], size: int = EXPORT_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Join small rows into chunks of about size bytes"""
+    parts, length = [], 0
+    async for row in rows:
+        parts.append(row)
+        length += len(row)
+        if length >= size:
+            yield b"".join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(findings: AsyncIterator[dict], export_format: str, gzip: bool = False) -> AsyncIterator[bytes]:
+    rows, _ = EXPORT_FORMATS[export_format]
+    stream = chunked(rows(findings))
+    return gzipped(stream) if gzip else stream
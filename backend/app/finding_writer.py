@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from decouple import config
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.database import (
+    add_findings, finding_helper, increment_scan_counters, mark_findings_seen, retrieve_findings_by_fingerprint
+)
+from app.scan_events import scan_events
+
+logger = logging.getLogger(__name__)
+
+# Flush buffered findings once this many are waiting...
+FINDING_FLUSH_SIZE = config("FINDING_FLUSH_SIZE", default=100, cast=int)
+# ...or once the oldest has waited this long
+FINDING_FLUSH_INTERVAL_MS = config("FINDING_FLUSH_INTERVAL_MS", default=500, cast=int)
+FINDING_FLUSH_RETRIES = config("FINDING_FLUSH_RETRIES", default=3, cast=int)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class FindingWriter:
+    """
+    Buffers the findings of one scan and writes them with unordered
+    insert_many, together with the matching severity counter increments
+    on the scan document. Findings already stored for the target are only
+    tagged with the scan, in one update_many per flush. Writes are retried;
+    findings that still cannot be written are counted in the scan's
+    `failed_writes`. A finding event is published once the finding is
+    stored, so stream clients that read the stored findings miss none.
+    """
+
+    def __init__(self, scan_id: str, user_id: str,
+                 flush_size: int = FINDING_FLUSH_SIZE,
+                 flush_interval_ms: int = FINDING_FLUSH_INTERVAL_MS,
+                 retries: int = FINDING_FLUSH_RETRIES):
+        self.scan_id = scan_id
+        self.user_id = user_id
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.retries = retries
+        self.buffer: List[dict] = []
+        self.seen_findings: List[Tuple[str, str]] = []
+        # Events of the seen findings, published once they are tagged
+        self.seen_events: List[dict] = []
+        self.increments: Counter = Counter()
+        self.lock = asyncio.Lock()
+        # The flush timer while it is sleeping, and every timer not finished yet
+        self.timer: Optional[asyncio.Task] = None
+        self.timers: Set[asyncio.Task] = set()
+        self.written = 0
+        self.failed = 0
+        # Time spent in database writes, for the scan's timing breakdown
+        self.write_seconds = 0.0
+
+    async def add(self, finding: dict, increments: dict) -> dict:
+        """
+        Queue a finding for writing and return its helper dict. The _id is
+        assigned here, so callers can reference the finding right away.
+        """
+        finding.setdefault("_id", ObjectId())
+        self.buffer.append(finding)
+        self.increments.update(increments)
+        await self._schedule_flush()
+        return finding_helper(finding)
+
+    async def seen(self, target: str, fingerprint: str, increments: dict, event: Optional[dict] = None):
+        """
+        Queue adding this scan to a finding already stored for the target;
+        event is published as the finding's event once that is written.
+        """
+        self.seen_findings.append((target, fingerprint))
+        if event is not None:
+            self.seen_events.append(event)
+        self.increments.update(increments)
+        await self._schedule_flush()
+
+    async def _schedule_flush(self):
+        if len(self.buffer) + len(self.seen_findings) >= self.flush_size:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.create_task(self._flush_later())
+            self.timers.add(self.timer)
+            self.timer.add_done_callback(self.timers.discard)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buffer and not self.seen_findings and not self.increments:
+                return
+            findings, self.buffer = self.buffer, []
+            seen, self.seen_findings = self.seen_findings, []
+            events, self.seen_events = self.seen_events, []
+            increments, self.increments = Counter(self.increments), Counter()
+            started = time.perf_counter()
+
+            failed, duplicates = await self._insert(findings)
+            not_stored = {finding["_id"] for finding in failed + duplicates}
+            stored = [finding for finding in findings if finding["_id"] not in not_stored]
+            self.written += len(stored)
+            for finding in stored:
+                scan_events.publish(self.scan_id, "finding", finding_helper(finding))
+
+            # A concurrent scan of the target stored these first; share them
+            shared = [(finding["target"], finding["fingerprint"]) for finding in duplicates]
+            failed_count = len(failed)
+            if await self._retry("tag", mark_findings_seen, self.user_id, self.scan_id, seen + shared):
+                for event in events:
+                    scan_events.publish(self.scan_id, "finding", event)
+                await self._publish_shared(shared)
+            else:
+                failed_count += len(seen) + len(shared)
+
+            if failed_count:
+                self.failed += failed_count
+                increments["failed_writes"] += failed_count
+                logger.error(f"Could not write {failed_count} findings of scan {self.scan_id}")
+
+            if not await self._retry("count", increment_scan_counters, self.scan_id, dict(increments)):
+                # Kept for the next flush, which retries them
+                self.increments.update(increments)
+            self.write_seconds += time.perf_counter() - started
+
+    async def _publish_shared(self, shared: List[Tuple[str, str]]):
+        """Publish findings stored by another scan under their stored id"""
+        if not shared:
+            return
+        try:
+            findings = await retrieve_findings_by_fingerprint(self.user_id, shared)
+        except PyMongoError as e:
+            logger.warning(f"Could not load {len(shared)} shared findings of scan {self.scan_id}: {str(e)}")
+            return
+        for finding in findings:
+            scan_events.publish(self.scan_id, "finding", {**finding, "scan_id": self.scan_id})
+
+    async def _retry(self, action: str, write: Callable[..., Awaitable], *args) -> bool:
+        """Run a write, retrying database errors. Returns False if every attempt failed."""
+        for attempt in range(self.retries + 1):
+            try:
+                await write(*args)
+                return True
+            except PyMongoError as e:
+                logger.warning(f"Could not {action} findings of scan {self.scan_id}, attempt {attempt + 1}: {str(e)}")
+            if attempt < self.retries:
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        return False
+
+    async def _insert(self, findings: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """
+        Insert findings, retrying failures. Returns the findings that could
+        not be written and those whose (target, fingerprint) already existed.
+        """
+        duplicates = []
+        for attempt in range(self.retries + 1):
+            try:
+                await add_findings(findings)
+                return [], duplicates
+            except BulkWriteError as e:
+                # Duplicates were written by an earlier attempt or another
+                # scan; retry the rest
+                retry_indexes = []
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") == DUPLICATE_KEY_ERROR:
+                        duplicates.append(findings[error["index"]])
+                    else:
+                        retry_indexes.append(error["index"])
+                findings = [findings[index] for index in retry_indexes]
+                if not findings:
+                    return [], duplicates
+                logger.warning(f"{len(findings)} findings of scan {self.scan_id} failed to write, attempt {attempt + 1}")
+            except PyMongoError as e:
+                logger.warning(f"Finding batch of scan {self.scan_id} failed to write, attempt {attempt + 1}: {str(e)}")
+            if attempt < self.retries:
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        return findings, duplicates
+
+    async def close(self):
+        """Write everything still buffered, after any flush the timer started."""
+        if self.timer is not None:
+            # Still sleeping: the flush below writes its findings
+            self.timer.cancel()
+        for result in await asyncio.gather(*self.timers, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Background flush of scan {self.scan_id} failed: {str(result)}")
+        await self.flush()
+        if self.increments:
+            logger.error(f"Lost counter updates of scan {self.scan_id}: {dict(self.increments)}")
@@ -0,0 +1,21 @@
+import hashlib
+from typing import Iterable, Optional
+
+
+def finding_fingerprint(template_id: Optional[str], host: Optional[str], matched_at: Optional[str],
+                        extracted_results: Optional[Iterable[str]]) -> str:
+    """
+    Stable identity of a finding across scans: the template, where it
+    matched, and its extracted results regardless of order or duplicates.
+    """
+    extracted = sorted({str(result).strip() for result in extracted_results or [] if str(result).strip()})
+    parts = [template_id or "", (host or "").strip().lower(), (matched_at or "").strip(), *extracted]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def document_fingerprint(finding: dict) -> str:
+    """Fingerprint of a stored finding, computed for documents written before fingerprints"""
+    return finding.get("fingerprint") or finding_fingerprint(
+        finding.get("template_id"), finding.get("host"),
+        finding.get("matched_at"), finding.get("extracted_results")
+    )
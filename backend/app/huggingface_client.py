@@ -1,40 +1,72 @@
-import requests
+import asyncio
 import logging
-from typing import Dict, Optional
+import random
+import time
+from typing import Dict, Optional, Tuple
 from decouple import config
+from .metrics import hf_request_seconds, hf_retries_total
+from .solution_cache import solution_cache, solution_key
 
 logger = logging.getLogger(__name__)
 
+# Requests sent to the inference API at the same time
+HF_MAX_CONCURRENCY = config("HF_MAX_CONCURRENCY", default=4, cast=int)
+# Pooled keep-alive connections
+HF_MAX_CONNECTIONS = config("HF_MAX_CONNECTIONS", default=10, cast=int)
+HF_TIMEOUT_SECONDS = config("HF_TIMEOUT_SECONDS", default=60, cast=float)
+HF_MAX_RETRIES = config("HF_MAX_RETRIES", default=4, cast=int)
+HF_BACKOFF_BASE_SECONDS = config("HF_BACKOFF_BASE_SECONDS", default=1.0, cast=float)
+HF_MAX_BACKOFF_SECONDS = config("HF_MAX_BACKOFF_SECONDS", default=30.0, cast=float)
+
 class HuggingFaceClient:
     def __init__(self):
         self.api_key = config("HF_API_KEY", default="")
         self.headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
         self.base_url = "https://api-inference.huggingface.co/models"
+        self.session = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.retries = 0
         
     async def generate_cybersecurity_solution(self, vulnerability_data: Dict) -> str:
         """
-        Generate AI-powered solution for a vulnerability using Hugging Face
+        Generate AI-powered solution for a vulnerability using Hugging Face,
+        reusing the cached solution of an identical finding when there is one
         """
-        model_name = "mistralai/Mistral-7B-Instruct-v0.2"  # Free model
-        
-        prompt = self._build_prompt(vulnerability_data)
-        
+        key = solution_key(
+            vulnerability_data.get('template_id'),
+            vulnerability_data.get('name'),
+            vulnerability_data.get('description')
+        )
+
         try:
-            response = await self._query_model(model_name, prompt)
-            return self._parse_response(response)
-            
+            return await solution_cache.get_or_generate(
+                key, lambda: self._generate(vulnerability_data), source="huggingface"
+            )
         except Exception as e:
             logger.error(f"Hugging Face API error: {str(e)}")
             return self._get_fallback_solution(vulnerability_data)
+
+    async def _generate(self, vulnerability_data: Dict) -> str:
+        model_name = "mistralai/Mistral-7B-Instruct-v0.2"  # Free model
+
+        prompt = self._build_prompt(vulnerability_data)
+        response = await self._query_model(model_name, prompt)
+        solution = self._parse_response(response)
+        if not solution:
+            raise Exception("Empty response")
+        return solution
     
     def _build_prompt(self, vulnerability_data: Dict) -> str:
-        """Build the prompt for the AI model"""
+        """
+        Build the prompt for the AI model. It leaves out the host so that
+        findings of the same template produce identical, shareable prompts.
+        """
         return f"""<s>[INST]As a cybersecurity expert, provide a detailed solution for this vulnerability:
 
 Vulnerability Name: {vulnerability_data.get('name', 'Unknown')}
 Severity: {vulnerability_data.get('severity', 'Unknown')}
 Description: {vulnerability_data.get('description', 'No description available')}
-Host: {vulnerability_data.get('host', 'Unknown')}
 
 Please provide:
 1. A brief explanation of the vulnerability
@@ -44,11 +76,42 @@ Please provide:
 
 Keep the response concise but comprehensive.[/INST]</s>"""
     
+    def _get_session(self):
+        """Shared keep-alive session, created on first use inside the event loop"""
+        import aiohttp
+
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=HF_MAX_CONNECTIONS, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=HF_TIMEOUT_SECONDS),
+            )
+            self.semaphore = asyncio.Semaphore(HF_MAX_CONCURRENCY)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
     async def _query_model(self, model_name: str, prompt: str) -> Dict:
-        """Query the Hugging Face model"""
+        """
+        Query the Hugging Face model. Concurrent calls with the same prompt
+        share one request.
+        """
+        key = (model_name, prompt)
+        if key in self.in_flight:
+            return await asyncio.shield(self.in_flight[key])
+
+        task = asyncio.ensure_future(self._query_with_retries(model_name, prompt))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _query_with_retries(self, model_name: str, prompt: str) -> Dict:
+        """POST to the inference API, retrying 503/429/5xx and network errors with backoff"""
         import aiohttp
-        import asyncio
-        
+
         url = f"{self.base_url}/{model_name}"
         
         payload = {
@@ -64,23 +127,48 @@ Keep the response concise but comprehensive.[/INST]</s>"""
                 "use_cache": True
             }
         }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url, 
-                headers=self.headers, 
-                json=payload,
-                timeout=30
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 503:
-                    # Model is loading, wait and retry
-                    await asyncio.sleep(10)
-                    async with session.post(url, headers=self.headers, json=payload) as retry_response:
-                        return await retry_response.json()
-                else:
-                    raise Exception(f"API error: {response.status}")
+
+        session = self._get_session()
+        for attempt in range(HF_MAX_RETRIES + 1):
+            delay = None
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                async with self.semaphore:
+                    async with session.post(url, json=payload) as response:
+                        if response.status == 200:
+                            outcome = "ok"
+                            return await response.json()
+                        if response.status == 503:
+                            # Model is loading; the body says how long it expects to take
+                            try:
+                                body = await response.json(content_type=None)
+                            except ValueError:
+                                body = None  # not JSON, e.g. a gateway's HTML error page
+                            estimated = body.get("estimated_time") if isinstance(body, dict) else None
+                            if estimated:
+                                delay = min(float(estimated), HF_MAX_BACKOFF_SECONDS)
+                        elif response.status != 429 and response.status < 500:
+                            raise Exception(f"API error: {response.status}")
+                        error = f"API error: {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            finally:
+                hf_request_seconds.observe(time.perf_counter() - started, outcome=outcome)
+
+            if attempt == HF_MAX_RETRIES:
+                break
+            if delay is None:
+                delay = min(HF_BACKOFF_BASE_SECONDS * 2 ** attempt, HF_MAX_BACKOFF_SECONDS)
+            # Jitter on top, so that concurrent retries don't hit the API together
+            # and none of them comes back before the estimated load time
+            delay = delay + random.uniform(0, delay * 0.5)
+            self.retries += 1
+            hf_retries_total.inc()
+            logger.warning(f"Hugging Face request failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        raise Exception(f"{error} after {HF_MAX_RETRIES + 1} attempts")
     
     def _parse_response(self, response: Dict) -> str:
         """Parse the model response"""
@@ -0,0 +1,289 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from decouple import config
+
+from app.ai_solution import hf_client
+from app.inference_backends import REMEDIATION_BACKEND, create_backend
+from app.metrics import inference_batch_size, inference_seconds, inference_tokens_total
+from app.model_server import REMEDIATION_SERVER_SOCKET, ModelServerClient
+from app.solution_cache import solution_cache, solution_key
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of findings generated together in one padded batch
+REMEDIATION_BATCH_SIZE = config("REMEDIATION_BATCH_SIZE", default=8, cast=int)
+# How long the first finding of a batch waits for others to join it
+REMEDIATION_MAX_WAIT_MS = config("REMEDIATION_MAX_WAIT_MS", default=50, cast=int)
+
+GPT2_MODEL_NAME = config("GPT2_MODEL_NAME", default="gpt2")
+# Load the model in the background at startup instead of on the first scan
+GPT2_WARMUP = config("GPT2_WARMUP", default=True, cast=bool)
+
+# Findings of these severities get no solution during the scan; it is
+# generated the first time someone asks for it
+REMEDIATION_DEFER_SEVERITIES = config(
+    "REMEDIATION_DEFER_SEVERITIES", default="low,info,unknown",
+    cast=lambda value: {severity.strip().lower() for severity in value.split(",") if severity.strip()}
+)
+# Remediation requests are served most severe first
+SEVERITY_PRIORITY = {"critical": 0, "high": 1, "medium": 2, "low": 3, "info": 4}
+
+FALLBACK_SOLUTION = "GPT-2 could not generate a specific fix. Please review the vulnerability manually."
+
+
+def severity_priority(severity: Optional[str]) -> int:
+    return SEVERITY_PRIORITY.get((severity or "").lower(), len(SEVERITY_PRIORITY))
+
+
+def is_deferred(severity: Optional[str]) -> bool:
+    return (severity or "unknown").lower() in REMEDIATION_DEFER_SEVERITIES
+
+
+def build_prompt(vuln_name: str, description: str) -> str:
+    return f"Vulnerability: {vuln_name}\nDescription: {description}\nRecommended Solution:"
+
+
+def extract_solution(generated_text: str) -> str:
+    """Keep only the generated part after "Recommended Solution:"."""
+    if "Recommended Solution:" in generated_text:
+        generated_text = generated_text.split("Recommended Solution:")[1]
+    generated_text = generated_text.strip()
+
+    # Fallback if GPT-2 output is empty
+    return generated_text or FALLBACK_SOLUTION
+
+
+# --- Hugging Face GPT-2 ---
+class RemediationModel:
+    """
+    GPT-2 on the configured inference backend, loaded on first use or by a
+    background warm-up so that importing the API does not pay for torch.
+    """
+
+    def __init__(self, model_name: str = GPT2_MODEL_NAME, backend: str = REMEDIATION_BACKEND):
+        self.model_name = model_name
+        self.backend = create_backend(backend, model_name)
+        self.state = "unloaded"
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        """Load the model. Blocking: run it on the inference thread."""
+        with self._lock:
+            if self.state == "ready":
+                return
+            self.state = "loading"
+            started = time.perf_counter()
+            try:
+                self.backend.load()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.error(f"Failed to load {self.model_name} on {self.backend.name}: {str(e)}")
+                raise
+            self.state = "ready"
+            self.error = None
+            logger.info(f"Loaded {self.model_name} on {self.backend.name} in {time.perf_counter() - started:.1f}s")
+
+    def generate_batch(self, prompts: List[str]) -> List[str]:
+        """
+        Generate solutions for a batch of prompts with GPT-2.
+        Blocking and CPU-bound: only call it from the inference thread.
+        """
+        self.load()
+        texts, prompt_tokens, generated_tokens = self.backend.generate(prompts)
+        inference_tokens_total.inc(prompt_tokens, kind="prompt")
+        inference_tokens_total.inc(generated_tokens, kind="generated")
+        return [extract_solution(text) for text in texts]
+
+    def status(self) -> dict:
+        return {"model": self.model_name, "backend": self.backend.name, "state": self.state, "error": self.error}
+
+
+class RemediationBatcher:
+    """
+    Collects remediation requests from the event loop into batches and runs
+    them on a dedicated inference thread, resolving one future per request.
+    """
+
+    def __init__(self, generate_fn: Callable[[List[str]], List[str]],
+                 batch_size: int = REMEDIATION_BATCH_SIZE,
+                 max_wait_ms: int = REMEDIATION_MAX_WAIT_MS):
+        self.generate_fn = generate_fn
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000
+        # torch already parallelises each generate call across cores
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remediation")
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        # Keeps requests of equal priority in arrival order
+        self.sequence = itertools.count()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.PriorityQueue()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run_in_executor(self, fn: Callable, *args):
+        """Run a blocking call on the inference thread, after queued batches."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def generate(self, prompt: str, priority: int = 0) -> str:
+        """Queue a prompt; lower priorities are batched and generated first."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((priority, next(self.sequence), prompt, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return [(prompt, future) for _, _, prompt, future in batch]
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            batch = [(prompt, future) for prompt, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            inference_batch_size.observe(len(batch))
+            started = time.perf_counter()
+            try:
+                results = await self.run_in_executor(
+                    self.generate_fn, [prompt for prompt, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Remediation batch of {len(batch)} failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                inference_seconds.observe(time.perf_counter() - started)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+gpt2 = RemediationModel()
+remediation_batcher = RemediationBatcher(gpt2.generate_batch)
+# With REMEDIATION_SERVER_SOCKET set, every API worker uses the one model
+# loaded by app.model_server instead of loading its own
+model_server = ModelServerClient(REMEDIATION_SERVER_SOCKET) if REMEDIATION_SERVER_SOCKET else None
+
+
+def model_ready() -> bool:
+    return model_server.ready if model_server is not None else gpt2.ready
+
+
+def model_status() -> dict:
+    return model_server.status() if model_server is not None else gpt2.status()
+
+
+def start_inference():
+    """
+    Start the batcher and, if GPT2_WARMUP is set, load the model in the
+    background; with a model server, connect to it instead.
+    """
+    if model_server is not None:
+        model_server.start()
+        return
+    remediation_batcher.start()
+    if GPT2_WARMUP:
+        load_model_in_background()
+
+
+async def stop_inference():
+    if model_server is not None:
+        await model_server.stop()
+    await remediation_batcher.stop()
+
+
+def request_model():
+    """Make the model available soon: load it locally or check on the model server."""
+    if model_server is not None:
+        model_server.refresh_status()
+    else:
+        load_model_in_background()
+
+
+def load_model_in_background():
+    if gpt2.state == "unloaded":
+        # Mark it now so concurrent callers don't schedule a second load
+        gpt2.state = "loading"
+        asyncio.create_task(_load_model())
+
+
+async def _load_model():
+    try:
+        await remediation_batcher.run_in_executor(gpt2.load)
+    except Exception:
+        pass  # state and error are recorded on the model
+
+
+async def try_generate_solution(vuln_name: str, description: str, template_id: Optional[str] = None,
+                                severity: Optional[str] = None) -> Optional[str]:
+    """
+    The cached or GPT-2 generated solution of a vulnerability, reusing the
+    solution of an identical finding when there is one; more severe findings
+    are generated first. None when there is none (model not loaded yet, or
+    generation failed).
+    """
+    key = solution_key(template_id, vuln_name, description)
+
+    if not model_ready():
+        cached = await solution_cache.get(key, count_miss=True)
+        if cached is None:
+            request_model()
+        return cached
+
+    generator = model_server if model_server is not None else remediation_batcher
+
+    async def generate() -> str:
+        solution = await generator.generate(
+            build_prompt(vuln_name, description), priority=severity_priority(severity)
+        )
+        if solution == FALLBACK_SOLUTION:
+            raise ValueError("GPT-2 produced an empty solution")
+        return solution
+
+    try:
+        return await solution_cache.get_or_generate(key, generate, source="gpt2")
+    except Exception:
+        return None
+
+
+def fallback_solution(vuln_name: str) -> str:
+    """
+    Generic advice for when no generated solution is available. Never
+    stored: the finding keeps solution None and is generated on demand.
+    """
+    if not model_ready():
+        return hf_client._get_fallback_solution({"name": vuln_name})
+    return FALLBACK_SOLUTION
@@ -0,0 +1,146 @@
+"""
+Inference engines for remediation generation, selected with
+REMEDIATION_BACKEND:
+
+    torch       full-precision PyTorch (default)
+    torch-int8  PyTorch with linear layers dynamically quantized to int8
+    onnx        ONNX Runtime, exported once with optimum (pip install optimum[onnxruntime])
+
+All of them use the fast (Rust) tokenizer, generate at most
+REMEDIATION_MAX_NEW_TOKENS new tokens and reuse the key/value cache between
+decoding steps. The heavy imports happen in load(), on the inference thread.
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Type
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+REMEDIATION_BACKEND = config("REMEDIATION_BACKEND", default="torch")
+# Tokens generated after the prompt (the old max_length=200 included the prompt)
+REMEDIATION_MAX_NEW_TOKENS = config("REMEDIATION_MAX_NEW_TOKENS", default=128, cast=int)
+# Where exported ONNX models are kept between restarts
+REMEDIATION_ONNX_DIR = config("REMEDIATION_ONNX_DIR", default=os.path.expanduser("~/.cache/remediation-onnx"))
+
+
+class InferenceBackend(ABC):
+    """A causal language model and its tokenizer; subclasses load the model."""
+
+    name = ""
+
+    def __init__(self, model_name: str, max_new_tokens: int = REMEDIATION_MAX_NEW_TOKENS):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.model = None
+        self.tokenizer = None
+
+    def load(self):
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+        # GPT-2 has no pad token; pad on the left so generation continues the prompt
+        tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+        self.model = self.load_model()
+        self.tokenizer = tokenizer
+
+    @abstractmethod
+    def load_model(self):
+        """The model for model_name, ready for generate()"""
+
+    def generate(self, prompts: List[str]) -> Tuple[List[str], int, int]:
+        """
+        Continue each prompt. Returns the generated texts (without the
+        prompts), the number of prompt tokens and of generated tokens.
+        """
+        import torch
+
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=True,
+                temperature=0.9,
+                top_p=0.95,
+                num_return_sequences=1,
+                use_cache=True,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+
+        generated = outputs[:, inputs["input_ids"].shape[1]:]
+        texts = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        prompt_tokens = int(inputs["attention_mask"].sum())
+        generated_tokens = int((generated != self.tokenizer.pad_token_id).sum())
+        return texts, prompt_tokens, generated_tokens
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def load_model(self):
+        from transformers import AutoModelForCausalLM
+
+        model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        model.eval()
+        return model
+
+
+class QuantizedTorchBackend(TorchBackend):
+    name = "torch-int8"
+
+    def load_model(self):
+        import torch
+
+        model = _conv1d_to_linear(super().load_model())
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def load_model(self):
+        from optimum.onnxruntime import ORTModelForCausalLM
+
+        export_dir = os.path.join(REMEDIATION_ONNX_DIR, self.model_name.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+        logger.info(f"Exporting {self.model_name} to ONNX in {export_dir}")
+        model = ORTModelForCausalLM.from_pretrained(self.model_name, export=True, use_cache=True)
+        model.save_pretrained(export_dir)
+        return model
+
+
+def _conv1d_to_linear(model):
+    """
+    GPT-2 implements its attention and MLP projections as transformers'
+    Conv1D, which dynamic quantization does not recognise; swap each for
+    the equivalent nn.Linear (Conv1D stores the weight transposed).
+    """
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight = torch.nn.Parameter(child.weight.t().contiguous())
+                linear.bias = child.bias
+                setattr(parent, child_name, linear)
+    return model
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    backend.name: backend for backend in (TorchBackend, QuantizedTorchBackend, OnnxBackend)
+}
+
+
+def create_backend(name: str, model_name: str) -> InferenceBackend:
+    try:
+        return BACKENDS[name](model_name)
+    except KeyError:
+        raise ValueError(f"Unknown REMEDIATION_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,186 @@
+"""
+Process-local counters and histograms, rendered in the Prometheus text
+exposition format by GET /metrics.
+"""
+import functools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; wide enough for both Mongo round-trips and whole scans
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # Updated from the inference thread as well as the event loop
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [bucket counts..., sum, count]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, series in self.values.items():
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labels, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+registry: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# --- Scan pipeline ---
+scan_stage_seconds = Histogram(
+    "scan_stage_seconds", "Time spent per scan in each pipeline stage", ("stage",)
+)
+scan_findings = Histogram(
+    "scan_findings", "Findings reported per scan", buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+scans_total = Counter("scans_total", "Scans finished, by outcome", ("status",))
+nuclei_parse_errors_total = Counter("nuclei_parse_errors_total", "Nuclei output lines that could not be parsed")
+
+# --- Remediation inference ---
+inference_seconds = Histogram("remediation_inference_seconds", "Duration of one remediation model batch")
+inference_batch_size = Histogram(
+    "remediation_batch_size", "Prompts per remediation model batch", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+inference_tokens_total = Counter("remediation_tokens_total", "Tokens processed by the remediation model", ("kind",))
+
+# --- Password hashing ---
+password_hash_seconds = Histogram(
+    "password_hash_seconds", "Duration of bcrypt hashes and checks, queueing included", ("operation",)
+)
+password_hash_pending = Gauge("password_hash_pending", "Password hashes queued or running")
+password_hash_rejected_total = Counter("password_hash_rejected_total", "Password hashes rejected with 503")
+
+# --- Solution cache ---
+solution_cache_lookups_total = Counter(
+    "solution_cache_lookups_total", "Solution cache lookups, by tier hit or miss", ("result",)
+)
+solution_cache_entries = Gauge("solution_cache_entries", "Solutions held in the in-process cache")
+
+# --- MongoDB ---
+mongo_operation_seconds = Histogram("mongo_operation_seconds", "Latency of database helpers", ("helper",))
+mongo_operation_errors_total = Counter("mongo_operation_errors_total", "Database helper calls that raised", ("helper",))
+
+# --- Hugging Face Inference API ---
+hf_request_seconds = Histogram("hf_request_seconds", "Latency of Hugging Face API attempts", ("outcome",))
+hf_retries_total = Counter("hf_retries_total", "Hugging Face API requests retried")
+
+
+def instrument_mongo(fn):
+    """Record the latency and failures of an async database helper under its name."""
+    helper = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            mongo_operation_errors_total.inc(helper=helper)
+            raise
+        finally:
+            mongo_operation_seconds.observe(time.perf_counter() - started, helper=helper)
+
+    return wrapper
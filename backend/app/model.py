@@ -59,6 +59,16 @@ class UserLoginSchema(BaseModel):
                 "password": "weakpassword"
             }
         }
+class BatchScanSchema(BaseModel):
+    targets: List[str] = Field(...)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "targets": ["https://example.com", "api.example.com"]
+            }
+        }
+
 class ScanResultSchema(BaseModel):
     user_email: str
     scan_id: str
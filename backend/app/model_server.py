@@ -0,0 +1,254 @@
+"""
+Shared remediation model server. With several uvicorn workers, set
+REMEDIATION_SERVER_SOCKET and run one server next to them:
+
+    cd backend
+    python -m app.model_server
+
+The server loads the model once and batches the prompts of every worker
+together; each worker keeps a single connection to it over the Unix
+socket. Messages are JSON lines: requests carry an id the reply echoes,
+and every reply includes the server's model state.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Unix socket of the shared model server; empty runs the model in each API worker
+REMEDIATION_SERVER_SOCKET = config("REMEDIATION_SERVER_SOCKET", default="")
+# How long a worker waits for one solution before giving up on it
+REMEDIATION_SERVER_TIMEOUT = config("REMEDIATION_SERVER_TIMEOUT", default=120, cast=float)
+# Longest JSON line either side accepts
+MESSAGE_LIMIT = 1024 * 1024
+# A worker waiting for the model asks the server for its state at most this often
+STATUS_INTERVAL_SECONDS = 1.0
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class ModelServerClient:
+    """
+    An API worker's connection to the model server. Requests are multiplexed
+    over one socket and matched to their replies by id; the connection is
+    reopened on the next request after it drops.
+    """
+
+    def __init__(self, path: str, timeout: float = REMEDIATION_SERVER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.model: Optional[str] = None
+        self.backend: Optional[str] = None
+        self.state = "unloaded"
+        self.error: Optional[str] = None
+        self.ids = itertools.count()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.status_task: Optional[asyncio.Task] = None
+        self.status_checked_at = 0.0
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> dict:
+        return {
+            "model": self.model, "backend": self.backend, "state": self.state,
+            "error": self.error, "server": self.path
+        }
+
+    def start(self):
+        self.refresh_status()
+
+    async def stop(self):
+        for task in (self.status_task, self.reader_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self.status_task = self.reader_task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def refresh_status(self):
+        """Ask the server for its model state in the background, at most once a second"""
+        if self.status_task is not None and not self.status_task.done():
+            return
+        if time.monotonic() - self.status_checked_at < STATUS_INTERVAL_SECONDS:
+            return
+        self.status_checked_at = time.monotonic()
+        self.status_task = asyncio.create_task(self._check_status())
+
+    async def _check_status(self):
+        try:
+            await self._request({"op": "status"})
+        except Exception:
+            pass  # recorded in state and error
+
+    async def generate(self, prompt: str, priority: int = 0) -> str:
+        """Generate on the server; lower priorities are batched and generated first."""
+        reply = await self._request({"op": "generate", "prompt": prompt, "priority": priority})
+        return reply["solution"]
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.writer is not None and not self.writer.is_closing():
+                return self.writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MESSAGE_LIMIT)
+            except OSError as e:
+                self.state = "unreachable"
+                self.error = f"Model server at {self.path}: {str(e)}"
+                raise
+            self.writer = writer
+            self.reader_task = asyncio.create_task(self._read_replies(reader, writer))
+            return writer
+
+    async def _request(self, message: dict) -> dict:
+        writer = await self._connect()
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            writer.write(_encode({**message, "id": request_id}))
+            await writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _read_replies(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                reply = json.loads(line)
+                self._update_status(reply.get("status"))
+                future = self.pending.pop(reply.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in reply:
+                    future.set_exception(RuntimeError(reply["error"]))
+                else:
+                    future.set_result(reply)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Connection to the model server at {self.path} failed: {str(e)}")
+        finally:
+            writer.close()
+            if self.writer is writer:
+                self.writer = None
+            self.state = "unreachable"
+            self.error = f"Connection to the model server at {self.path} closed"
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(self.error))
+            self.pending.clear()
+
+    def _update_status(self, status: Optional[dict]):
+        if status:
+            self.model = status.get("model")
+            self.backend = status.get("backend")
+            self.state = status.get("state", self.state)
+            self.error = status.get("error")
+
+
+class ModelServer:
+    """Serves the local remediation model and batcher to API workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def serve(self):
+        from app.inference import remediation_batcher, load_model_in_background
+
+        remediation_batcher.start()
+        load_model_in_background()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left behind by a server that did not shut down cleanly
+        server = await asyncio.start_unix_server(self.handle, self.path, limit=MESSAGE_LIMIT)
+        # Only processes of the same user (the API workers) may connect
+        os.chmod(self.path, 0o600)
+        logger.info(f"Model server listening on {self.path}")
+
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        try:
+            async with server:
+                await stopping.wait()
+        finally:
+            await remediation_batcher.stop()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one worker's requests concurrently, so they can share batches."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.reply(json.loads(line), writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping model server connection: {str(e)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def reply(self, request: dict, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        from app.inference import gpt2, remediation_batcher
+
+        reply = {"id": request.get("id")}
+        op = request.get("op")
+        try:
+            if op == "generate":
+                reply["solution"] = await remediation_batcher.generate(
+                    request["prompt"], priority=request.get("priority", 0)
+                )
+            elif op != "status":
+                reply["error"] = f"Unknown op {op!r}"
+        except Exception as e:
+            reply["error"] = str(e) or type(e).__name__
+        reply["status"] = gpt2.status()
+        async with write_lock:
+            if writer.is_closing():
+                return
+            writer.write(_encode(reply))
+            try:
+                await writer.drain()
+            except OSError:
+                pass  # the worker went away; handle() cleans up
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the remediation model to API workers")
+    parser.add_argument("--socket", default=REMEDIATION_SERVER_SOCKET,
+                        help="Unix socket path (default REMEDIATION_SERVER_SOCKET)")
+    args = parser.parse_args(argv)
+    if not args.socket:
+        parser.error("set REMEDIATION_SERVER_SOCKET or pass --socket")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(ModelServer(args.socket).serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
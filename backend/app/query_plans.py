@@ -0,0 +1,104 @@
+"""
+Explain the queries issued by the database helpers and flag collection scans.
+
+    cd backend
+    python -m app.query_plans [--create-indexes]
+
+Exits with status 1 when any query's winning plan contains a COLLSCAN,
+so it can run in CI against a staging database.
+"""
+import argparse
+import asyncio
+import sys
+from typing import Iterator, List
+
+from app.database import (
+    user_collection, scan_collection, finding_collection, trend_collection, ensure_indexes, USER_SCANS_SORT
+)
+
+# One entry per helper query: (helper, collection, filter, sort).
+# Filter values are placeholders; only the query shape matters to the planner.
+HELPER_QUERIES = [
+    ("retrieve_user_by_email", user_collection, {"email": "user@example.com"}, None),
+    ("retrieve_user_scans", scan_collection, {"user_id": "user@example.com"}, USER_SCANS_SORT),
+    ("retrieve_scan_findings", finding_collection, {"scan_ids": "000000000000000000000000"}, [("_id", 1)]),
+    ("iter_findings", finding_collection,
+     {"scan_ids": {"$in": ["000000000000000000000000", "000000000000000000000001"]}}, [("_id", 1)]),
+    ("retrieve_user_scan_ids", scan_collection,
+     {"user_id": "user@example.com", "created_at": {"$gte": 0, "$lt": 1}}, USER_SCANS_SORT),
+    ("retrieve_known_findings", finding_collection,
+     {"user_id": "user@example.com", "target": "example.com", "fingerprint": {"$exists": True}}, None),
+    ("retrieve_previous_scan", scan_collection,
+     {"user_id": "user@example.com", "target": "example.com", "status": "completed"}, USER_SCANS_SORT),
+    ("retrieve_trends", trend_collection,
+     {"user_id": "user@example.com", "period": "day", "start": {"$gte": 0, "$lt": 1}}, [("target", 1), ("start", 1)]),
+    ("retrieve_scan_findings_seen_since", finding_collection,
+     {"scan_ids": "000000000000000000000000", "last_seen_at": {"$gte": 0}}, [("last_seen_at", 1)]),
+    ("latest_finding_seen_at", finding_collection, {"scan_ids": "000000000000000000000000"}, [("last_seen_at", -1)]),
+    ("retrieve_unsolved_findings", finding_collection,
+     {"scan_ids": "000000000000000000000000", "solution": None, "offloaded": {"$ne": "solution"}}, None),
+    ("renew_scan_leases", scan_collection, {"owner": "host:1:0", "status": {"$in": ["queued", "running"]}}, None),
+    ("fail_interrupted_scans", scan_collection,
+     {"status": {"$in": ["queued", "running"]}, "lease_expires_at": {"$not": {"$gte": 0}}}, None),
+    ("retrieve_active_scan", scan_collection, {"active_key": "user@example.com||example.com"}, None),
+    ("retrieve_fresh_scan", scan_collection,
+     {"user_id": "user@example.com", "target": "example.com", "profile": "", "finished_at": {"$gte": 0},
+      "status": "completed"},
+     [("finished_at", -1)]),
+]
+
+
+def plan_stages(plan: dict) -> Iterator[str]:
+    """Yield every stage name of an explain() plan tree."""
+    yield plan.get("stage", "")
+    if "inputStage" in plan:
+        yield from plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+    # Slot-based engine plans nest the classic plan under queryPlan
+    if "queryPlan" in plan:
+        yield from plan_stages(plan["queryPlan"])
+
+
+async def check_query_plans() -> List[dict]:
+    results = []
+    for helper, collection, query, sort in HELPER_QUERIES:
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+        results.append({
+            "helper": helper,
+            "collection": collection.name,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            # A blocking SORT stage means the index does not cover the sort
+            "in_memory_sort": "SORT" in stages,
+        })
+    return results
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--create-indexes", action="store_true", help="run ensure_indexes() first")
+    args = parser.parse_args(argv)
+
+    if args.create_indexes:
+        await ensure_indexes()
+
+    failed = False
+    for result in await check_query_plans():
+        if result["collscan"]:
+            failed = True
+            flag = "COLLSCAN"
+        elif result["in_memory_sort"]:
+            flag = "SORT"
+        else:
+            flag = "ok"
+        print(f"{flag:8} {result['helper']:28} {result['collection']:10} {' <- '.join(result['stages'])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,107 @@
+"""
+JSON responses for large payloads: fast encoding, gzip/brotli compression
+and strong ETags for conditional requests.
+"""
+import gzip
+import hashlib
+import json
+from typing import Optional
+
+from decouple import config
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson  # optional: pip install orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = config("COMPRESS_MIN_BYTES", default=1024, cast=int)
+GZIP_LEVEL = config("GZIP_LEVEL", default=6, cast=int)
+BROTLI_QUALITY = config("BROTLI_QUALITY", default=5, cast=int)
+# Larger bodies are compressed off the event loop
+COMPRESS_THREAD_BYTES = 256 * 1024
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(request: Request) -> dict:
+    """Content codings of Accept-Encoding and their quality values"""
+    accepted = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def accepted_encoding(request: Request) -> Optional[str]:
+    """The best compression the client accepts: br, then gzip, else None"""
+    accepted = _accepted_encodings(request)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def accepts_gzip(request: Request) -> bool:
+    return _accepted_encodings(request).get("gzip", 0) > 0
+
+
+def make_etag(encoding: Optional[str], *parts) -> str:
+    """Strong ETag of a representation: its version parts plus the content encoding"""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}-{encoding or "identity"}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding", **(headers or {})})
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def json_response(request: Request, data, etag: Optional[str] = None,
+                        headers: Optional[dict] = None) -> Response:
+    """Encode data as JSON, compressed with the encoding the client accepts"""
+    body = dumps(data)
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    encoding = accepted_encoding(request)
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        if len(body) >= COMPRESS_THREAD_BYTES:
+            body = await run_in_threadpool(_compress, body, encoding)
+        else:
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    if etag:
+        headers["ETag"] = etag
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before a slow client starts losing them
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Events after which a scan stream is closed
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+class ScanEventBroker:
+    """
+    In-process publish/subscribe hub for scan progress. Scan workers
+    publish findings and status changes, stream endpoints subscribe to them.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, scan_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers[scan_id].add(queue)
+        return queue
+
+    def unsubscribe(self, scan_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(scan_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[scan_id]
+
+    def publish(self, scan_id: str, event: str, data: dict):
+        for queue in list(self.subscribers.get(scan_id, ())):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping {event} event for slow subscriber of scan {scan_id}")
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+scan_events = ScanEventBroker()
@@ -0,0 +1,559 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from decouple import config
+from pydantic import ValidationError
+
+from app.database import (
+    update_scan, increment_scan_counters, finish_scan_shard, finding_helper, retrieve_known_findings,
+    resolve_missing_findings, renew_scan_leases, fail_interrupted_scans, retrieve_unsolved_findings,
+    update_finding_solution, SEVERITY_LEVELS
+)
+from app.finding_writer import FindingWriter
+from app.fingerprint import finding_fingerprint
+from app.metrics import nuclei_parse_errors_total, scan_findings, scan_stage_seconds, scans_total
+from app.model import ScanResult
+from app.scan_events import scan_events
+from app.trends import record_scan_trends
+from app.user_stats import record_scan
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of nuclei processes running at the same time
+SCAN_MAX_CONCURRENCY = config("SCAN_MAX_CONCURRENCY", default=os.cpu_count() or 2, cast=int)
+# Maximum number of scans (or batch scan shards) waiting for a free worker
+SCAN_QUEUE_SIZE = config("SCAN_QUEUE_SIZE", default=100, cast=int)
+NUCLEI_BIN = config("NUCLEI_BIN", default="nuclei")
+# Longest single JSONL line accepted from nuclei (responses can be embedded)
+NUCLEI_LINE_LIMIT = config("NUCLEI_LINE_LIMIT", default=16 * 1024 * 1024, cast=int)
+# Findings of one scan waiting for a solution or being saved at the same time
+SCAN_FINDING_CONCURRENCY = config("SCAN_FINDING_CONCURRENCY", default=32, cast=int)
+# Targets per nuclei process of a batch scan (passed with -l)
+SCAN_SHARD_SIZE = config("SCAN_SHARD_SIZE", default=50, cast=int)
+# Most targets accepted in one batch scan
+SCAN_BATCH_MAX_TARGETS = config("SCAN_BATCH_MAX_TARGETS", default=10000, cast=int)
+# Requests per second of all the nuclei processes of one API worker together: each
+# process gets a fixed 1/SCAN_MAX_CONCURRENCY share (-rl, at least 1). Every uvicorn
+# worker applies it separately.
+NUCLEI_RATE_LIMIT = config("NUCLEI_RATE_LIMIT", default=150, cast=int)
+# Templates nuclei runs in parallel (-c), which bounds the requests in flight to one host
+NUCLEI_HOST_CONCURRENCY = config("NUCLEI_HOST_CONCURRENCY", default=10, cast=int)
+# Default freshness window: a scan request within this many minutes of a completed
+# scan of the same target and template profile gets that scan (0 always rescans)
+SCAN_REUSE_MINUTES = config("SCAN_REUSE_MINUTES", default=0, cast=int)
+# Unfinished scans are leased to the process holding their jobs and renewed every
+# third of this; once a lease expires (the process died) any process fails the scan
+SCAN_LEASE_SECONDS = config("SCAN_LEASE_SECONDS", default=60, cast=int)
+
+# Owner of the scans queued by this process
+SCAN_OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class ScanJob:
+    scan_id: str
+    user_id: str
+    targets: List[str]
+    # Index in the parent scan's shards, None for a single-target scan
+    shard: Optional[int] = None
+    # Template tags passed to nuclei with -tags; empty runs its default templates
+    profile: str = ""
+    # Filled in while the scan runs, for the user's statistics
+    severity_counts: Counter = field(default_factory=Counter)
+    vuln_types: Dict[str, dict] = field(default_factory=dict)
+    # Severity counts and total_vulns per target, for its trend buckets
+    target_counts: Dict[str, Counter] = field(default_factory=dict)
+    # Findings already stored for the targets, by (target, fingerprint), and those seen so far
+    known: Dict[Tuple[str, str], dict] = field(default_factory=dict)
+    fingerprints: Set[Tuple[str, str]] = field(default_factory=set)
+    # Seconds per pipeline stage; solution and parse are summed over findings
+    timings: Counter = field(default_factory=Counter)
+    queued_at: float = field(default_factory=time.perf_counter)
+    started_at: Optional[float] = None
+
+    def timing_breakdown(self) -> Dict[str, float]:
+        """Seconds per stage, stored on the scan document as `timings`"""
+        timings = dict(self.timings)
+        if self.started_at is not None:
+            timings["total"] = time.perf_counter() - self.started_at
+        return {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+    def target_of(self, host: Optional[str]) -> str:
+        """The scanned target a finding's host belongs to"""
+        if len(self.targets) == 1 or not host:
+            return self.targets[0]
+        if host in self.targets:
+            return host
+        host_key = _host_key(host)
+        for target in self.targets:
+            if _host_key(target) == host_key:
+                return target
+        return host
+
+
+class ScanJobManager:
+    """
+    Runs nuclei scans in a bounded pool of asyncio workers so that the
+    request handlers only create the scan document and enqueue the work.
+    Batch scans are split into shards that run as separate jobs.
+    """
+
+    def __init__(self, solution_generator: Callable[..., Awaitable[Optional[str]]],
+                 defer_solution: Callable[[Optional[str]], bool] = lambda severity: False,
+                 bulk_solution_generator: Optional[Callable[[List[dict]], Awaitable[List[Optional[str]]]]] = None,
+                 max_concurrency: int = SCAN_MAX_CONCURRENCY,
+                 queue_size: int = SCAN_QUEUE_SIZE):
+        self.solution_generator = solution_generator
+        # Severities whose solution is left for GET /finding/{id}/solution
+        self.defer_solution = defer_solution
+        # Generates the solutions a completed scan is still missing, all at once
+        self.bulk_solution_generator = bulk_solution_generator
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Queue slots held by reserve() for jobs submitted after an await
+        self.reserved = 0
+        self.owner = SCAN_OWNER_ID
+        self.workers: List[asyncio.Task] = []
+        self.heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.workers:
+            return
+        for index in range(self.max_concurrency):
+            self.workers.append(asyncio.create_task(self._worker(index)))
+        self.heartbeat = asyncio.create_task(self._heartbeat())
+        logger.info(f"Started {self.max_concurrency} scan workers")
+
+    async def stop(self):
+        tasks = [*self.workers, *([self.heartbeat] if self.heartbeat else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.heartbeat = None
+
+    def lease(self) -> dict:
+        """Fields of a new scan document leasing it to this process"""
+        return {"owner": self.owner, "lease_expires_at": datetime.utcnow() + timedelta(seconds=SCAN_LEASE_SECONDS)}
+
+    async def _heartbeat(self):
+        """Renew this process's scan leases and fail scans whose owner has died"""
+        while True:
+            try:
+                await renew_scan_leases(self.owner, datetime.utcnow() + timedelta(seconds=SCAN_LEASE_SECONDS))
+                interrupted = await fail_interrupted_scans()
+                if interrupted:
+                    logger.warning(f"Marked {interrupted} scans of stopped processes as failed")
+            except Exception:
+                logger.exception("Could not renew scan leases")
+            await asyncio.sleep(SCAN_LEASE_SECONDS / 3)
+
+    def submit(self, job: ScanJob, reserved: bool = False):
+        """
+        Enqueue a scan. Raises asyncio.QueueFull when the backlog is full,
+        unless the job uses a slot held by reserve().
+        """
+        if reserved:
+            self.release(1)
+        elif self.free_slots() <= 0:
+            raise asyncio.QueueFull
+        self.queue.put_nowait(job)
+
+    def reserve(self, count: int) -> bool:
+        """
+        Hold count queue slots so that jobs created after an await can still
+        be queued. Submit them with reserved=True or give the slots back with
+        release(). Returns False, holding nothing, if there is no room.
+        """
+        if count > self.free_slots():
+            return False
+        self.reserved += count
+        return True
+
+    def release(self, count: int):
+        self.reserved = max(0, self.reserved - count)
+
+    def free_slots(self) -> int:
+        """Jobs that can still be queued before submit() raises QueueFull"""
+        if self.queue.maxsize <= 0:
+            return SCAN_BATCH_MAX_TARGETS
+        return self.queue.maxsize - self.queue.qsize() - self.reserved
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run(job)
+            except asyncio.CancelledError:
+                await self._fail(job, "Scan interrupted")
+                raise
+            except Exception as e:
+                logger.exception(f"Scan worker {index} failed on scan {job.scan_id}")
+                await self._fail(job, str(e))
+            finally:
+                self.queue.task_done()
+
+    async def _fail(self, job: ScanJob, error: str):
+        """Mark a job failed; errors are logged so the worker keeps running"""
+        try:
+            await self._finish(job, "failed", error=error)
+        except Exception:
+            logger.exception(f"Could not mark scan {job.scan_id} as failed")
+
+    def nuclei_args(self, job: ScanJob, targets_file: Optional[str] = None) -> List[str]:
+        # A fixed share, so that even max_concurrency processes stay within the limit
+        rate_limit = max(1, NUCLEI_RATE_LIMIT // self.max_concurrency)
+        inputs = ["-l", targets_file] if targets_file else ["-u", job.targets[0]]
+        args = [
+            NUCLEI_BIN, *inputs, "-j",
+            "-rl", str(rate_limit), "-c", str(NUCLEI_HOST_CONCURRENCY),
+        ]
+        if job.profile:
+            args += ["-tags", job.profile]
+        return args
+
+    async def run(self, job: ScanJob):
+        job.started_at = time.perf_counter()
+        job.timings["queue"] = job.started_at - job.queued_at
+        now = datetime.utcnow()
+        if job.shard is None:
+            await update_scan(job.scan_id, {"status": "running", "started_at": now})
+            scan_events.publish(job.scan_id, "status", {"status": "running"})
+        else:
+            await update_scan(job.scan_id, {
+                "status": "running", f"shards.{job.shard}.status": "running", f"shards.{job.shard}.started_at": now
+            })
+            scan_events.publish(job.scan_id, "shard", {"shard": job.shard, "status": "running"})
+        job.known = await retrieve_known_findings(job.user_id, job.targets)
+
+        targets_file = None
+        if job.shard is not None:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+                f.write("\n".join(job.targets) + "\n")
+            targets_file = f.name
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.nuclei_args(job, targets_file),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=NUCLEI_LINE_LIMIT,
+            )
+            nuclei_started = time.perf_counter()
+            stderr_task = asyncio.create_task(_read_tail(process.stderr))
+            writer = FindingWriter(job.scan_id, job.user_id)
+            try:
+                await self._consume_findings(job, process.stdout, writer)
+                await process.wait()
+                job.timings["nuclei"] = time.perf_counter() - nuclei_started
+                stderr_tail = await stderr_task
+            except BaseException:
+                # Cancelled or failed while nuclei runs: don't leave it behind with nobody reading its pipes
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                stderr_task.cancel()
+                await asyncio.gather(stderr_task, return_exceptions=True)
+                raise
+            finally:
+                await writer.close()
+                job.timings["write"] = writer.write_seconds
+        finally:
+            if targets_file:
+                os.unlink(targets_file)
+
+        if process.returncode != 0:
+            await self._finish(job, "failed", error=f"Nuclei scan failed: {stderr_tail}")
+            return
+
+        # A scan restricted to some templates cannot tell whether the others' findings are fixed
+        if not job.profile:
+            resolved = await resolve_missing_findings(job.user_id, job.targets, job.scan_id)
+            if resolved:
+                await increment_scan_counters(job.scan_id, {"resolved_vulns": resolved})
+        if self.bulk_solution_generator is not None:
+            await self._fill_missing_solutions(job)
+        await self._finish(job, "completed")
+
+    async def _fill_missing_solutions(self, job: ScanJob):
+        """
+        Generate the solutions the scan left empty, except deferred severities,
+        with one bulk call. Failures leave them for GET /finding/{id}/solution.
+        """
+        solution_started = time.perf_counter()
+        try:
+            findings = [
+                finding for finding in await retrieve_unsolved_findings(
+                    job.scan_id, job.targets if job.shard is not None else None
+                )
+                if not self.defer_solution(finding.get("severity"))
+            ]
+            if not findings:
+                return
+            solutions = await self.bulk_solution_generator(findings)
+            for finding, solution in zip(findings, solutions):
+                if solution is not None:
+                    await update_finding_solution(finding, solution)
+        except Exception:
+            logger.exception(f"Bulk remediation of scan {job.scan_id} failed")
+        finally:
+            job.timings["solution"] += time.perf_counter() - solution_started
+
+    async def _finish(self, job: ScanJob, status: str, error: Optional[str] = None):
+        """
+        Record the outcome of a job. A batch scan completes with its last
+        shard, and fails only when every shard failed.
+        """
+        timings = job.timing_breakdown()
+        scans_total.inc(status=status)
+        scan_findings.observe(len(job.fingerprints))
+        for stage, seconds in timings.items():
+            scan_stage_seconds.observe(seconds, stage=stage)
+
+        if job.shard is None:
+            finished_at = await _set_scan_status(job.scan_id, status, error, timings=timings)
+            if status == "completed":
+                await _record_stats(job.user_id, job.severity_counts, job.vuln_types, finished_at)
+                await _record_trends(job, finished_at)
+            return
+
+        fields = {"status": status, "finished_at": datetime.utcnow(), "timings": timings}
+        if error:
+            fields["error"] = error
+        scan = await finish_scan_shard(job.scan_id, job.shard, fields)
+        scan_events.publish(job.scan_id, "shard", {"shard": job.shard, "status": status, "error": error})
+        if status == "completed":
+            await _record_stats(job.user_id, job.severity_counts, job.vuln_types, fields["finished_at"], scans=0)
+            await _record_trends(job, fields["finished_at"])
+        if not scan or scan.get("shards_done", 0) < scan.get("shard_count", 0):
+            return
+
+        failed = sum(1 for shard in scan.get("shards", []) if shard.get("status") == "failed")
+        shard_count = scan["shard_count"]
+        finished_at = await _set_scan_status(
+            job.scan_id,
+            "failed" if failed == shard_count else "completed",
+            error=f"{failed} of {shard_count} shards failed" if failed else None
+        )
+        if failed < shard_count:
+            # The batch counts as one scan in the user's statistics
+            await _record_stats(job.user_id, {}, {}, finished_at)
+
+    async def _consume_findings(self, job: ScanJob, stdout: asyncio.StreamReader, writer: FindingWriter):
+        """
+        Process nuclei JSONL output line by line while the scan is running.
+        Findings are handled concurrently so their solutions can share
+        inference batches; the semaphore bounds how many are in flight.
+        """
+        in_flight = asyncio.Semaphore(SCAN_FINDING_CONCURRENCY)
+        pending = set()
+
+        async def handle(vuln: ScanResult):
+            try:
+                await self._process_finding(job, vuln, writer)
+            except Exception:
+                logger.exception(f"Failed to process finding {vuln.template_id} of scan {job.scan_id}")
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                try:
+                    line = await stdout.readline()
+                except ValueError:
+                    logger.warning(f"Skipping nuclei output line over {NUCLEI_LINE_LIMIT} bytes")
+                    continue
+                if not line:
+                    break
+                line = line.decode(errors="replace").strip()
+                if not line:
+                    continue
+
+                parse_started = time.perf_counter()
+                vuln = parse_finding(line)
+                job.timings["parse"] += time.perf_counter() - parse_started
+                if vuln is None:
+                    continue
+
+                await in_flight.acquire()
+                task = asyncio.create_task(handle(vuln))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            raise
+
+    async def _process_finding(self, job: ScanJob, vuln: ScanResult, writer: FindingWriter):
+        target = job.target_of(vuln.host)
+        fingerprint = finding_fingerprint(vuln.template_id, vuln.host, vuln.matched_at, vuln.extracted_results)
+        if (target, fingerprint) in job.fingerprints:
+            return
+        job.fingerprints.add((target, fingerprint))
+
+        known = job.known.get((target, fingerprint))
+        if known:
+            # Unchanged since an earlier scan: keep its solution, store nothing new
+            vuln.solution = known.get("solution")
+            increments = {"unchanged_vulns": 1}
+        elif self.defer_solution(vuln.severity):
+            vuln.solution = None
+            increments = {"new_vulns": 1, "deferred_solutions": 1}
+        else:
+            solution_started = time.perf_counter()
+            vuln.solution = await self.solution_generator(
+                vuln.name or vuln.template_id or "Unknown",
+                vuln.description or "No description provided",
+                template_id=vuln.template_id,
+                severity=vuln.severity
+            )
+            job.timings["solution"] += time.perf_counter() - solution_started
+            increments = {"new_vulns": 1}
+            if vuln.solution is None:
+                # Model still loading or generation failed: left for GET /finding/{id}/solution
+                increments["deferred_solutions"] = 1
+
+        # Count severity as the finding arrives; written with the next flush
+        increments["total_vulns"] = 1
+        if job.shard is not None:
+            increments[f"shards.{job.shard}.findings"] = 1
+        sev = vuln.severity.lower() if vuln.severity else "low"
+        target_counts = job.target_counts.setdefault(target, Counter())
+        target_counts["total_vulns"] += 1
+        if sev in SEVERITY_LEVELS:
+            increments[sev] = 1
+            job.severity_counts[sev] += 1
+            target_counts[sev] += 1
+        vuln_type = job.vuln_types.setdefault(
+            vuln.template_id, {"name": vuln.name, "severity": vuln.severity, "count": 0}
+        )
+        vuln_type["count"] += 1
+
+        # The writer publishes the finding event once the finding is stored
+        if known:
+            await writer.seen(target, fingerprint, increments, finding_helper({
+                "_id": known["_id"], "scan_id": job.scan_id, **vuln.dict(),
+                "fingerprint": fingerprint, "status": "open",
+            }))
+        else:
+            now = datetime.utcnow()
+            await writer.add({
+                "scan_id": job.scan_id, **vuln.dict(),
+                "fingerprint": fingerprint, "user_id": job.user_id, "target": target,
+                "scan_ids": [job.scan_id], "status": "open", "first_seen_at": now, "last_seen_at": now,
+            }, increments)
+
+
+def parse_finding(line: str) -> Optional[ScanResult]:
+    """Turn one line of nuclei JSONL output into a ScanResult, None if it is not a finding."""
+    try:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("not a JSON object")
+        info = data.get("info", {})
+        if not isinstance(info, dict):
+            raise ValueError("info is not an object")
+        return ScanResult(
+            template_id=data.get("template-id") or data.get("template"),
+            name=info.get("name"),
+            severity=info.get("severity"),
+            host=data.get("host"),
+            description=info.get("description"),
+            matched_at=data.get("matched-at"),
+            extracted_results=data.get("extracted-results"),
+            curl_command=data.get("curl-command"),
+            solution=None
+        )
+    except (ValueError, TypeError, AttributeError, ValidationError) as e:
+        nuclei_parse_errors_total.inc()
+        logger.warning(f"Skipping unparseable nuclei output line: {e}")
+        return None
+
+
+async def _set_scan_status(scan_id: str, status: str, error: Optional[str] = None,
+                           timings: Optional[Dict[str, float]] = None) -> datetime:
+    fields = {"status": status, "finished_at": datetime.utcnow()}
+    if error:
+        fields["error"] = error
+    if timings:
+        fields["timings"] = timings
+    # Releases the target, so the next request for it starts a new scan
+    await update_scan(scan_id, fields, unset=["active_key", "owner", "lease_expires_at"])
+    scan_events.publish(scan_id, "status", {"status": status, "error": error})
+    return fields["finished_at"]
+
+
+async def _record_stats(user_id: str, severity_counts: Dict[str, int], vuln_types: Dict[str, dict],
+                        finished_at: datetime, scans: int = 1):
+    try:
+        await record_scan(user_id, severity_counts, vuln_types, finished_at, scans=scans)
+    except Exception:
+        logger.exception(f"Failed to update statistics of user {user_id}")
+
+
+async def _record_trends(job: ScanJob, finished_at: datetime):
+    if job.profile:
+        return  # a tag-restricted scan would show as a drop in the target's trend
+    # Every scanned target gets a data point, including clean ones
+    targets = dict.fromkeys([*job.targets, *job.target_counts])
+    try:
+        await record_scan_trends(
+            job.user_id, job.scan_id, {target: job.target_counts.get(target, {}) for target in targets}, finished_at
+        )
+    except Exception:
+        logger.exception(f"Failed to update trends of scan {job.scan_id}")
+
+
+def parse_targets(lines: List[str]) -> List[str]:
+    """Targets of a batch scan: one per line, without blanks, comments or duplicates"""
+    targets = []
+    for line in lines:
+        target = line.strip()
+        if target and not target.startswith("#"):
+            targets.append(target)
+    return list(dict.fromkeys(targets))
+
+
+def normalize_profile(tags: Optional[str]) -> str:
+    """Template profile of a scan: its nuclei tags, sorted and without duplicates"""
+    if not tags:
+        return ""
+    return ",".join(sorted({tag.strip().lower() for tag in tags.split(",") if tag.strip()}))
+
+
+def shard_targets(targets: List[str], shard_size: int = SCAN_SHARD_SIZE) -> List[List[str]]:
+    shard_size = max(1, shard_size)
+    return [targets[index:index + shard_size] for index in range(0, len(targets), shard_size)]
+
+
+def _host_key(target: str) -> str:
+    """Host name of a target given as a URL, host:port or bare host"""
+    parts = urlsplit(target if "://" in target else f"//{target}")
+    return (parts.hostname or target).lower()
+
+
+async def _read_tail(stream: asyncio.StreamReader, max_lines: int = 20) -> str:
+    """Drain a stream, keeping only its last lines for error reporting."""
+    tail = deque(maxlen=max_lines)
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            continue
+        if not line:
+            break
+        tail.append(line.decode(errors="replace").rstrip())
+    return "\n".join(tail)
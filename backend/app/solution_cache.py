@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from decouple import config
+
+from app.database import solution_collection
+from app.metrics import solution_cache_lookups_total, solution_cache_entries
+
+logger = logging.getLogger(__name__)
+
+# In-process tier limits; the Mongo tier keeps every solution
+SOLUTION_CACHE_SIZE = config("SOLUTION_CACHE_SIZE", default=2048, cast=int)
+SOLUTION_CACHE_TTL_SECONDS = config("SOLUTION_CACHE_TTL_SECONDS", default=3600, cast=int)
+
+
+def solution_key(template_id: Optional[str], name: Optional[str], description: Optional[str]) -> str:
+    """
+    Cache key of a finding's solution: the nuclei template id plus a hash of
+    the whitespace/case-normalized name and description.
+    """
+    normalized = " ".join(f"{name or ''}\n{description or ''}".lower().split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{template_id or 'unknown'}:{digest}"
+
+
+class SolutionCache:
+    """
+    Two-tier remediation cache: a bounded LRU with TTL in front of the
+    `solutions` collection. Concurrent misses on the same key share one
+    generation.
+    """
+
+    def __init__(self, collection=solution_collection,
+                 max_size: int = SOLUTION_CACHE_SIZE,
+                 ttl_seconds: int = SOLUTION_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Future] = {}
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, solution = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            solution_cache_entries.set(len(self.entries))
+            return None
+        self.entries.move_to_end(key)
+        return solution
+
+    def _set_memory(self, key: str, solution: str):
+        self.entries[key] = (time.monotonic() + self.ttl, solution)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        solution_cache_entries.set(len(self.entries))
+
+    async def get(self, key: str, count_miss: bool = False) -> Optional[str]:
+        """
+        The cached solution for key, or None. Misses are only counted when
+        count_miss is set: get_or_generate counts its own, once per generation.
+        """
+        solution = self._get_memory(key)
+        if solution is not None:
+            solution_cache_lookups_total.inc(result="memory_hit")
+            return solution
+
+        try:
+            doc = await self.collection.find_one({"_id": key}, {"solution": 1})
+        except Exception as e:
+            logger.error(f"Solution cache lookup failed for {key}: {str(e)}")
+            doc = None
+        if doc and doc.get("solution"):
+            solution_cache_lookups_total.inc(result="db_hit")
+            self._set_memory(key, doc["solution"])
+            return doc["solution"]
+        if count_miss:
+            solution_cache_lookups_total.inc(result="miss")
+        return None
+
+    async def set(self, key: str, solution: str, source: str):
+        self._set_memory(key, solution)
+        template_id = key.rsplit(":", 1)[0]
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "template_id": template_id,
+                "solution": solution,
+                "source": source,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]], source: str) -> str:
+        """
+        Return the cached solution for key, or generate and store it.
+        Exceptions from generate are propagated and nothing is cached.
+        """
+        solution = await self.get(key)
+        if solution is not None:
+            return solution
+
+        if key in self.in_flight:
+            return await asyncio.shield(self.in_flight[key])
+
+        solution_cache_lookups_total.inc(result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            solution = await generate()
+            try:
+                await self.set(key, solution, source)
+            except Exception as e:
+                logger.error(f"Failed to persist cached solution {key}: {str(e)}")
+            future.set_result(solution)
+            return solution
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+
+solution_cache = SolutionCache()
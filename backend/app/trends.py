@@ -0,0 +1,205 @@
+"""
+Per-target vulnerability trends, pre-aggregated into daily and weekly
+buckets as scans complete.
+
+One document per user, period, target and bucket in `trends`:
+
+    {user_id, period: "day" | "week", target, start,
+     scans, sum: {critical, high, medium, low, total_vulns},
+     peak: {...}, latest: {...}, latest_at, latest_scan_id}
+
+`latest` holds the counts of the last scan in the bucket (the target's state
+at the end of the period), `peak` the highest, `sum` the totals over `scans`.
+Weeks start on Monday, UTC. Scans restricted to template tags are left out,
+since they only see part of a target's findings.
+
+Rebuild the buckets from the scan history with:
+
+    cd backend
+    python -m app.trends [--user USER_ID]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database import scan_collection, trend_collection, SEVERITY_LEVELS
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week")
+TREND_FIELDS = (*SEVERITY_LEVELS, "total_vulns")
+# Buckets written per bulk request by the rebuild
+REBUILD_BATCH_SIZE = 1000
+
+
+def bucket_start(moment: datetime, period: str) -> datetime:
+    """Start of the bucket a moment falls in (same as Mongo's $dateTrunc)"""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+async def record_scan_trends(user_id: str, scan_id: str, target_counts: Dict[str, Dict[str, int]],
+                             finished_at: datetime):
+    """
+    Add one completed scan to the daily and weekly buckets of each of its
+    targets. target_counts maps targets to their severity counts and
+    total_vulns; targets without findings are recorded with zeros.
+    """
+    operations = []
+    for target, counts in target_counts.items():
+        values = {field: counts.get(field, 0) for field in TREND_FIELDS}
+        for period in PERIODS:
+            key = {"user_id": user_id, "period": period, "target": target,
+                   "start": bucket_start(finished_at, period)}
+            operations.append(UpdateOne(key, {
+                "$inc": {"scans": 1, **{f"sum.{field}": value for field, value in values.items()}},
+                "$max": {f"peak.{field}": value for field, value in values.items()},
+            }, upsert=True))
+            # Scans can finish out of order; only the latest one sets `latest`
+            operations.append(UpdateOne(
+                {**key, "$or": [{"latest_at": {"$exists": False}}, {"latest_at": {"$lte": finished_at}}]},
+                {"$set": {"latest": values, "latest_at": finished_at, "latest_scan_id": scan_id}}
+            ))
+    if not operations:
+        return
+    try:
+        await trend_collection.bulk_write(operations, ordered=True)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        # Two scans creating the same bucket at once: the loser retries from
+        # its failed upsert, which now updates the winner's document
+        if not errors or errors[0].get("code") != 11000:
+            raise
+        await trend_collection.bulk_write(operations[errors[0]["index"]:], ordered=True)
+
+
+def trend_helper(bucket: dict) -> dict:
+    scans = bucket.get("scans", 0)
+    sums = bucket.get("sum", {})
+    return {
+        "target": bucket.get("target"),
+        "period": bucket.get("period"),
+        "start": bucket.get("start"),
+        "scans": scans,
+        "latest": bucket.get("latest", {}),
+        "peak": bucket.get("peak", {}),
+        "average": {field: round(sums.get(field, 0) / scans, 2) if scans else 0 for field in TREND_FIELDS},
+    }
+
+
+async def retrieve_trends(user_id: str, period: str, since: datetime, until: datetime,
+                          target: Optional[str] = None) -> List[dict]:
+    """The user's buckets starting in [since, until), by target and then start"""
+    query = {"user_id": user_id, "period": period, "start": {"$gte": bucket_start(since, period), "$lt": until}}
+    if target:
+        query["target"] = target
+    cursor = trend_collection.find(query, {"_id": 0}).sort([("target", ASCENDING), ("start", ASCENDING)])
+    return [trend_helper(bucket) async for bucket in cursor]
+
+
+def _rebuild_pipeline(match: dict, period: str) -> List[dict]:
+    truncate = {"date": "$finished", "unit": period}
+    if period == "week":
+        truncate["startOfWeek"] = "monday"
+    return [
+        {"$match": match},
+        {"$set": {
+            "scan_id": {"$toString": "$_id"},
+            "finished": {"$ifNull": ["$finished_at", "$created_at"]},
+            # Batch scans list their targets; single scans have just one
+            "scan_targets": {"$ifNull": ["$targets", ["$target"]]},
+        }},
+        # Severity counts of a batch scan's findings, per target
+        {"$lookup": {
+            "from": "findings",
+            "localField": "scan_id",
+            "foreignField": "scan_ids",
+            "let": {"batch": {"$isArray": "$targets"}},
+            "pipeline": [
+                {"$match": {"$expr": "$$batch"}},
+                {"$set": {"severity": {"$toLower": {"$ifNull": ["$severity", "low"]}}}},
+                {"$group": {
+                    "_id": "$target",
+                    "total_vulns": {"$sum": 1},
+                    **{severity: {"$sum": {"$cond": [{"$eq": ["$severity", severity]}, 1, 0]}}
+                       for severity in SEVERITY_LEVELS},
+                }},
+            ],
+            "as": "counts",
+        }},
+        {"$unwind": "$scan_targets"},
+        # A single-target scan's own counters cover all of its findings, including
+        # those stored before findings had a target; batch scans need the lookup
+        {"$set": {"target_counts": {"$cond": [
+            {"$isArray": "$targets"},
+            {"$first": {"$filter": {"input": "$counts", "cond": {"$eq": ["$$this._id", "$scan_targets"]}}}},
+            {field: f"${field}" for field in TREND_FIELDS},
+        ]}}},
+        {"$set": {
+            "start": {"$dateTrunc": truncate},
+            "values": {field: {"$ifNull": [f"$target_counts.{field}", 0]} for field in TREND_FIELDS},
+        }},
+        {"$sort": {"finished": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "target": "$scan_targets", "start": "$start"},
+            "scans": {"$sum": 1},
+            **{f"sum_{field}": {"$sum": f"$values.{field}"} for field in TREND_FIELDS},
+            **{f"peak_{field}": {"$max": f"$values.{field}"} for field in TREND_FIELDS},
+            "latest": {"$last": "$values"},
+            "latest_at": {"$last": "$finished"},
+            "latest_scan_id": {"$last": "$scan_id"},
+        }},
+    ]
+
+
+async def rebuild_trends(user_id: Optional[str] = None) -> int:
+    """
+    Recompute the buckets from the scans and findings collections with an
+    aggregation pipeline per period. Returns the number of buckets written.
+    """
+    match = {"status": "completed", "profile": {"$in": ["", None]}}
+    if user_id:
+        match["user_id"] = user_id
+
+    written = 0
+    for period in PERIODS:
+        operations = []
+        async for row in scan_collection.aggregate(_rebuild_pipeline(match, period), allowDiskUse=True):
+            key = {"user_id": row["_id"]["user_id"], "period": period,
+                   "target": row["_id"]["target"], "start": row["_id"]["start"]}
+            operations.append(ReplaceOne(key, {
+                **key,
+                "scans": row["scans"],
+                "sum": {field: row[f"sum_{field}"] for field in TREND_FIELDS},
+                "peak": {field: row[f"peak_{field}"] for field in TREND_FIELDS},
+                "latest": row["latest"],
+                "latest_at": row["latest_at"],
+                "latest_scan_id": row["latest_scan_id"],
+            }, upsert=True))
+            if len(operations) >= REBUILD_BATCH_SIZE:
+                await trend_collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+                operations = []
+        if operations:
+            await trend_collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+    return written
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild per-target vulnerability trend buckets")
+    parser.add_argument("--user", help="only rebuild this user id")
+    args = parser.parse_args(argv)
+    count = await rebuild_trends(args.user)
+    print(f"Rebuilt {count} trend buckets")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+"""
+Per-user dashboard statistics, maintained incrementally as scans complete.
+
+One document per user in `user_stats`:
+
+    {_id: user_id, total_scans, total_vulns, critical, high, medium, low,
+     last_scan_at, vuln_types: {<template>: {name, severity, count}},
+     weekly: {<ISO week>: {scans, vulns}}}
+
+Rebuild it from the scan history with:
+
+    cd backend
+    python -m app.user_stats [--user USER_ID]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.database import scan_collection, user_stats_collection, SEVERITY_LEVELS
+
+
+def week_key(moment: datetime) -> str:
+    """ISO week of a date, e.g. 2025-W07 (same as Mongo's %G-W%V)"""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def field_key(template_id: Optional[str]) -> str:
+    """Template id usable as a document field name"""
+    return (template_id or "unknown").replace(".", "_").replace("$", "_")
+
+
+async def record_scan(user_id: str, severity_counts: Dict[str, int], vuln_types: Dict[str, dict],
+                      finished_at: datetime, scans: int = 1):
+    """
+    Add one completed scan to the user's statistics in a single atomic update.
+    vuln_types maps template ids to {"name", "severity", "count"}. Shards of a
+    batch scan are recorded with scans=0, except the one completing the batch.
+    """
+    # Like the scan's total_vulns, this includes findings of other severities
+    total_vulns = sum(vuln_type["count"] for vuln_type in vuln_types.values())
+    week = week_key(finished_at)
+    increments = {
+        "total_scans": scans,
+        "total_vulns": total_vulns,
+        f"weekly.{week}.scans": scans,
+        f"weekly.{week}.vulns": total_vulns,
+    }
+    fields = {}
+    for severity in SEVERITY_LEVELS:
+        increments[severity] = severity_counts.get(severity, 0)
+    for template_id, vuln_type in vuln_types.items():
+        key = field_key(template_id)
+        increments[f"vuln_types.{key}.count"] = vuln_type["count"]
+        fields[f"vuln_types.{key}.name"] = vuln_type["name"]
+        fields[f"vuln_types.{key}.severity"] = vuln_type["severity"]
+
+    update = {"$inc": increments, "$max": {"last_scan_at": finished_at}}
+    if fields:
+        update["$set"] = fields
+    await user_stats_collection.update_one({"_id": user_id}, update, upsert=True)
+
+
+async def get_user_stats(user_id: str) -> dict:
+    stats = await user_stats_collection.find_one({"_id": user_id})
+    return stats or {"_id": user_id}
+
+
+async def last_scan_at(user_id: str) -> Optional[datetime]:
+    """When the user's latest scan completed; later scans may resolve earlier findings"""
+    stats = await user_stats_collection.find_one({"_id": user_id}, {"last_scan_at": 1})
+    return (stats or {}).get("last_scan_at")
+
+
+def weekly_change(stats: dict, field: str, now: Optional[datetime] = None) -> str:
+    """Change of a weekly counter between last week and this week, e.g. "+25%"."""
+    now = now or datetime.utcnow()
+    weekly = stats.get("weekly", {})
+    current = weekly.get(week_key(now), {}).get(field, 0)
+    previous = weekly.get(week_key(now - timedelta(weeks=1)), {}).get(field, 0)
+    if not previous:
+        return "+100%" if current else "+0%"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def top_vulnerability_types(stats: dict, limit: int = 3) -> list:
+    vuln_types = sorted(stats.get("vuln_types", {}).values(), key=lambda t: t.get("count", 0), reverse=True)
+    return [
+        {"type": t.get("name"), "severity": t.get("severity"), "count": t.get("count", 0)}
+        for t in vuln_types[:limit]
+    ]
+
+
+async def rebuild_user_stats(user_id: Optional[str] = None) -> int:
+    """
+    Recompute statistics from the scans and findings collections with
+    aggregation pipelines. Returns the number of users rebuilt.
+    """
+    match = {"status": "completed"}
+    if user_id:
+        match["user_id"] = user_id
+
+    totals = {}
+    async for row in scan_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "total_scans": {"$sum": 1},
+            "total_vulns": {"$sum": "$total_vulns"},
+            **{severity: {"$sum": f"${severity}"} for severity in SEVERITY_LEVELS},
+            "last_scan_at": {"$max": {"$ifNull": ["$finished_at", "$created_at"]}},
+        }},
+    ]):
+        totals[row.pop("_id")] = {**row, "vuln_types": {}, "weekly": {}}
+
+    async for row in scan_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "week": {"$dateToString": {
+                    "format": "%G-W%V", "date": {"$ifNull": ["$finished_at", "$created_at"]}
+                }},
+            },
+            "scans": {"$sum": 1},
+            "vulns": {"$sum": "$total_vulns"},
+        }},
+    ]):
+        if row["_id"]["user_id"] in totals:
+            totals[row["_id"]["user_id"]]["weekly"][row["_id"]["week"]] = {
+                "scans": row["scans"], "vulns": row["vulns"]
+            }
+
+    async for row in scan_collection.aggregate([
+        {"$match": match},
+        {"$set": {"scan_id": {"$toString": "$_id"}}},
+        # Findings are stored once per target and list every scan they were seen in
+        {"$lookup": {
+            "from": "findings",
+            "localField": "scan_id",
+            "foreignField": "scan_ids",
+            "pipeline": [{"$project": {"template_id": 1, "name": 1, "severity": 1}}],
+            "as": "findings",
+        }},
+        {"$unwind": "$findings"},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "template_id": "$findings.template_id"},
+            "name": {"$first": "$findings.name"},
+            "severity": {"$first": "$findings.severity"},
+            "count": {"$sum": 1},
+        }},
+    ]):
+        if row["_id"]["user_id"] in totals:
+            totals[row["_id"]["user_id"]]["vuln_types"][field_key(row["_id"]["template_id"])] = {
+                "name": row["name"], "severity": row["severity"], "count": row["count"]
+            }
+
+    for stats_user_id, stats in totals.items():
+        await user_stats_collection.replace_one({"_id": stats_user_id}, stats, upsert=True)
+    return len(totals)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild per-user dashboard statistics")
+    parser.add_argument("--user", help="only rebuild this user id")
+    args = parser.parse_args(argv)
+    count = await rebuild_user_stats(args.user)
+    print(f"Rebuilt statistics for {count} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
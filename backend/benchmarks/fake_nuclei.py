@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the nuclei binary, used by the benchmarks through NUCLEI_BIN.
+Accepts the options the scan workers pass and prints synthetic JSONL
+findings for every target.
+
+    FAKE_NUCLEI_FINDINGS  findings per target (default 20)
+    FAKE_NUCLEI_RATE      findings per second, 0 for no delay (default 0)
+    FAKE_NUCLEI_TEMPLATES distinct templates the findings cycle through (default 10)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SEVERITIES = ("critical", "high", "medium", "low", "info")
+
+
+def synthetic_finding(target: str, index: int, templates: int) -> dict:
+    template = index % templates
+    return {
+        "template-id": f"bench-template-{template}",
+        "info": {
+            "name": f"Benchmark finding {template}",
+            "severity": SEVERITIES[template % len(SEVERITIES)],
+            "description": f"Synthetic finding produced by template {template} for benchmarks.",
+        },
+        "host": target,
+        "matched-at": f"{target}/path/{index}",
+        "extracted-results": [f"value-{index}"],
+        "curl-command": f"curl -X GET '{target}/path/{index}'",
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fake nuclei for benchmarks")
+    parser.add_argument("-u", dest="target")
+    parser.add_argument("-l", dest="target_list")
+    parser.add_argument("-j", action="store_true")
+    parser.add_argument("-rl", type=int)
+    parser.add_argument("-c", type=int)
+    parser.add_argument("-tags")
+    args, _ = parser.parse_known_args(argv)
+
+    targets = [args.target] if args.target else []
+    if args.target_list:
+        with open(args.target_list) as f:
+            targets += [line.strip() for line in f if line.strip()]
+    if not targets:
+        print("no targets given", file=sys.stderr)
+        return 1
+
+    findings = int(os.environ.get("FAKE_NUCLEI_FINDINGS", 20))
+    rate = float(os.environ.get("FAKE_NUCLEI_RATE", 0))
+    templates = max(1, int(os.environ.get("FAKE_NUCLEI_TEMPLATES", 10)))
+
+    for target in targets:
+        for index in range(findings):
+            sys.stdout.write(json.dumps(synthetic_finding(target, index, templates)) + "\n")
+            sys.stdout.flush()
+            if rate > 0:
+                time.sleep(1 / rate)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
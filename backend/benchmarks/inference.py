@@ -0,0 +1,129 @@
+"""
+Compare the remediation inference backends on this host.
+
+    cd backend
+    python -m benchmarks.inference [--backends torch,torch-int8,onnx] [--batches 10] [--batch-size 8]
+
+Each backend runs in its own process so that its peak RSS is measured on
+its own. Reports load time, generated tokens per second, batch latency and
+peak RSS, and writes them as JSON to benchmarks/results/.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+
+PROMPTS = [
+    ("SQL Injection", "User input is concatenated into a SQL query in the login form."),
+    ("Cross-Site Scripting", "The search parameter is reflected into the page without encoding."),
+    ("Exposed .git directory", "The .git folder of the web root is publicly readable."),
+    ("Outdated TLS", "The server accepts TLS 1.0 and weak CBC cipher suites."),
+    ("Open Redirect", "The next parameter redirects to arbitrary external URLs."),
+    ("Missing security headers", "Content-Security-Policy and X-Frame-Options are not set."),
+    ("Directory listing", "Autoindex is enabled on /uploads."),
+    ("Default credentials", "The admin panel accepts admin/admin."),
+]
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_backend(backend_name: str, model_name: str, batches: int, batch_size: int) -> dict:
+    """Benchmark one backend in this process"""
+    from app.inference import build_prompt
+    from app.inference_backends import create_backend
+
+    backend = create_backend(backend_name, model_name)
+    started = time.perf_counter()
+    backend.load()
+    load_seconds = time.perf_counter() - started
+
+    prompts = [build_prompt(*PROMPTS[index % len(PROMPTS)]) for index in range(batch_size)]
+    backend.generate(prompts)  # warm-up, not measured
+
+    latencies = []
+    generated_tokens = 0
+    for _ in range(batches):
+        started = time.perf_counter()
+        _, _, tokens = backend.generate(prompts)
+        latencies.append(time.perf_counter() - started)
+        generated_tokens += tokens
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "backend": backend_name,
+        "load_seconds": round(load_seconds, 3),
+        "batches": batches,
+        "batch_size": batch_size,
+        "generated_tokens": generated_tokens,
+        "tokens_per_second": round(generated_tokens / total, 2) if total else 0.0,
+        "prompts_per_second": round(batches * batch_size / total, 2) if total else 0.0,
+        "batch_latency_ms": {
+            "p50": round(latencies[len(latencies) // 2] * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1),
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare remediation inference backends")
+    parser.add_argument("--backends", default="torch,torch-int8,onnx")
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--output", help="results file (default benchmarks/results/inference-<timestamp>.json)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.model, args.batches, args.batch_size)))
+        return 0
+
+    results = []
+    for backend_name in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.inference", "--child", backend_name, "--model", args.model,
+             "--batches", str(args.batches), "--batch-size", str(args.batch_size)],
+            cwd=BENCHMARKS_DIR.parent, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()[-1:] or ["failed"]
+            print(f"{backend_name:11} failed: {error[0]}", file=sys.stderr)
+            results.append({"backend": backend_name, "error": error[0]})
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{backend_name:11} {result['tokens_per_second']:8.1f} tok/s  "
+              f"p50 batch {result['batch_latency_ms']['p50']:8.1f} ms  "
+              f"load {result['load_seconds']:6.1f} s  peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+    started_at = datetime.utcnow()
+    output = Path(args.output) if args.output else (
+        BENCHMARKS_DIR / "results" / f"inference-{started_at:%Y%m%dT%H%M%SZ}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "started_at": started_at.isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "model": args.model,
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
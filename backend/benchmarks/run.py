@@ -0,0 +1,261 @@
+"""
+Benchmark the API in-process against a fake nuclei and a throwaway database.
+
+    cd backend
+    python -m benchmarks.run [--concurrency 10] [--requests 200] [--history 1000]
+                             [--mongo-uri mongomock://] [--compare benchmarks/results/old.json]
+
+Requires httpx, plus mongomock-motor for the default in-memory database
+(or pass --mongo-uri of a local mongod; the benchmark database is dropped
+first). Results are written as JSON to benchmarks/results/.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SCENARIOS = ("login", "scan", "history", "dashboard")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scan API")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--history", type=int, default=1000, help="completed scans seeded for the user")
+    parser.add_argument("--findings", type=int, default=20, help="findings the fake nuclei emits per target")
+    parser.add_argument("--finding-rate", type=float, default=0, help="findings per second, 0 for no delay")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--mongo-uri", default="mongomock://")
+    parser.add_argument("--mongo-db", default="benchmark")
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="remediation model to load")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Point the app at the fakes; must run before anything imports app."""
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.mongo_db
+    os.environ["NUCLEI_BIN"] = str(BENCHMARKS_DIR / "fake_nuclei.py")
+    os.environ["FAKE_NUCLEI_FINDINGS"] = str(args.findings)
+    os.environ["FAKE_NUCLEI_RATE"] = str(args.finding_rate)
+    os.environ["GPT2_MODEL_NAME"] = args.model
+    os.environ["SCAN_QUEUE_SIZE"] = str(max(args.requests, 100))
+    os.environ.setdefault("secret", "benchmark-secret")
+    os.environ.setdefault("algorithm", "HS256")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(request: Callable[[int], Awaitable[int]], total: int, concurrency: int) -> dict:
+    """Issue `total` requests with at most `concurrency` in flight and summarise them."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                status = await request(index)
+            except Exception:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            if status >= 400 or status == 0:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def seed_history(user_id: str, count: int, seed: int):
+    """Completed scans spread over the last eight weeks, with matching statistics"""
+    from app.database import scan_collection, SEVERITY_LEVELS
+    from app.user_stats import record_scan
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    scans = []
+    for index in range(count):
+        finished_at = now - timedelta(minutes=rng.randint(1, 8 * 7 * 24 * 60))
+        counts = {severity: rng.randint(0, 5) for severity in SEVERITY_LEVELS}
+        scans.append({
+            "user_id": user_id,
+            "target": f"history-{index}.example.com",
+            "profile": "",
+            "total_vulns": sum(counts.values()),
+            **counts,
+            "status": "completed",
+            "created_at": finished_at - timedelta(seconds=30),
+            "finished_at": finished_at,
+        })
+        await record_scan(user_id, counts, {
+            "bench-template": {"name": "Benchmark finding", "severity": "high", "count": sum(counts.values())}
+        }, finished_at)
+    if scans:
+        await scan_collection.insert_many(scans)
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    from app.api import app, scan_jobs
+    from app.auth.passwords import password_hasher
+    from app.ai_solution import hf_client
+    from app.database import client, ensure_indexes
+    from app.inference import start_inference, stop_inference
+
+    await client.drop_database(args.mongo_db)
+    if not args.mongo_uri.startswith("mongomock://"):
+        await ensure_indexes()
+    start_inference()
+    await scan_jobs.start()
+
+    results: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            credentials = {"email": "bench@example.com", "password": "Benchmark@123"}
+            response = await http.post("/user/signup", json={
+                "fullname": "Benchmark User", "companyname": "Benchmark", **credentials
+            })
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            await seed_history(credentials["email"], args.history, args.seed)
+
+            async def login(index: int) -> int:
+                return (await http.post("/user/login", json=credentials)).status_code
+
+            async def scan(index: int) -> int:
+                params = {"target": f"https://scan-{index}.example.com"}
+                return (await http.get("/scan", params=params, headers=headers)).status_code
+
+            async def history(index: int) -> int:
+                return (await http.get("/scan/history", params={"limit": 50}, headers=headers)).status_code
+
+            async def dashboard(index: int) -> int:
+                return (await http.get("/dashboard", headers=headers)).status_code
+
+            requests = {"login": login, "scan": scan, "history": history, "dashboard": dashboard}
+            for name in [name.strip() for name in args.scenarios.split(",") if name.strip()]:
+                if name not in requests:
+                    raise SystemExit(f"Unknown scenario {name}")
+                started = time.perf_counter()
+                results[name] = await run_scenario(requests[name], args.requests, args.concurrency)
+                if name == "scan":
+                    # End to end: until every queued scan has been run and stored
+                    await scan_jobs.queue.join()
+                    elapsed = time.perf_counter() - started
+                    results["scan_pipeline"] = {
+                        "scans": args.requests,
+                        "findings": args.requests * args.findings,
+                        "seconds": round(elapsed, 4),
+                        "scans_per_second": round(args.requests / elapsed, 2),
+                        "findings_per_second": round(args.requests * args.findings / elapsed, 2),
+                    }
+                print(f"{name:10} done in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    finally:
+        await scan_jobs.stop()
+        await stop_inference()
+        password_hasher.shutdown()
+        await hf_client.close()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, previous: dict = None):
+    previous = (previous or {}).get("scenarios", {})
+    print(f"{'scenario':10} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        if "latency_ms" not in result:
+            continue
+        latency = result["latency_ms"]
+        line = (f"{name:10} {result['throughput_rps']:9.1f} {latency['p50']:9.2f} "
+                f"{latency['p95']:9.2f} {latency['p99']:9.2f} {result['errors']:7d}")
+        before = previous.get(name)
+        if before and before["latency_ms"]["p95"] and before["throughput_rps"]:
+            p95_change = (latency["p95"] - before["latency_ms"]["p95"]) / before["latency_ms"]["p95"] * 100
+            rps_change = (result["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+            line += f"   p95 {p95_change:+.0f}%  rps {rps_change:+.0f}%"
+        print(line)
+    if "scan_pipeline" in results:
+        pipeline = results["scan_pipeline"]
+        print(f"scan pipeline: {pipeline['scans_per_second']} scans/s, "
+              f"{pipeline['findings_per_second']} findings/s")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    started_at = datetime.utcnow()
+    results = asyncio.run(benchmark(args))
+
+    report = {
+        "started_at": started_at.isoformat() + "Z",
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": results,
+    }
+    output = Path(args.output) if args.output else (
+        BENCHMARKS_DIR / "results" / f"{started_at:%Y%m%dT%H%M%SZ}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_results(results, previous)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
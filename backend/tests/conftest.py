@@ -0,0 +1,29 @@
+"""
+Tests that need the database run against mongomock-motor's in-memory
+stand-in (pip install mongomock-motor), as the benchmarks do, and are
+skipped without it. The environment must be set before app is imported.
+"""
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+if importlib.util.find_spec("mongomock_motor"):
+    os.environ.setdefault("MONGO_URI", "mongomock://")
+os.environ.setdefault("MONGO_DB_NAME", "test")
+os.environ.setdefault("secret", "test-secret-of-at-least-32-bytes!")
+os.environ.setdefault("algorithm", "HS256")
+
+
+@pytest.fixture
+def database():
+    """An empty in-memory database"""
+    pytest.importorskip("mongomock_motor")
+    pytest.importorskip("decouple")
+    from app.database import client, MONGO_DB_NAME, MONGO_URI
+
+    if not MONGO_URI.startswith("mongomock://"):
+        pytest.skip("MONGO_URI points at a real server")
+    asyncio.run(client.drop_database(MONGO_DB_NAME))
+    yield client[MONGO_DB_NAME]
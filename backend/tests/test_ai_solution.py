@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("decouple")
+pytest.importorskip("motor")
+
+from app import ai_solution
+from app.ai_solution import generate_ai_solutions, hf_client
+
+
+def test_bulk_generation_keeps_order_and_bounds_parallelism(monkeypatch):
+    running, peak = 0, 0
+
+    async def generate(vulnerability_data):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if vulnerability_data["name"] == "fails":
+            return hf_client._get_fallback_solution(vulnerability_data)
+        return f"Fix {vulnerability_data['name']}"
+
+    monkeypatch.setattr(ai_solution.hf_client, "generate_cybersecurity_solution", generate)
+    names = [f"finding {index}" for index in range(10)] + ["fails"]
+    solutions = asyncio.run(generate_ai_solutions([{"name": name} for name in names], parallelism=3))
+    assert solutions == [f"Fix finding {index}" for index in range(10)] + [None]
+    assert peak == 3
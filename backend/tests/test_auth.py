@@ -0,0 +1,82 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("jwt")
+pytest.importorskip("decouple")
+pytest.importorskip("fastapi")
+import jwt
+
+from app.auth import auth_handler
+from app.auth.auth_bearer import JWTBearer
+from app.auth.auth_handler import decode_jwt, sign_jwt
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    auth_handler._verified_tokens.clear()
+    yield
+    auth_handler._verified_tokens.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(auth_handler, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_handler.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_verified_tokens_skip_the_signature_check(decodes):
+    token = sign_jwt("user@example.com")["access_token"]
+    assert decode_jwt(token)["user_id"] == "user@example.com"
+    assert decode_jwt(token)["user_id"] == "user@example.com"
+    assert len(decodes) == 1
+
+
+def test_cached_token_is_rejected_once_expired(clock, decodes):
+    token = sign_jwt("user@example.com")["access_token"]
+    assert decode_jwt(token) is not None
+    clock[0] += 86400 + 1
+    assert decode_jwt(token) is None
+    assert not auth_handler._verified_tokens
+    assert decode_jwt(token) is None
+    assert len(decodes) == 2
+
+
+def test_invalid_tokens_are_not_cached():
+    payload = {"user_id": "admin", "expires": time.time() + 60}
+    forged = jwt.encode(payload, "not-the-secret-but-just-as-long-!!", algorithm="HS256")
+    assert decode_jwt(forged) is None
+    assert decode_jwt("garbage") is None
+    assert not auth_handler._verified_tokens
+
+
+def test_token_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth_handler, "TOKEN_CACHE_SIZE", 2)
+    tokens = [sign_jwt(f"user{index}@example.com")["access_token"] for index in range(3)]
+    for token in tokens:
+        decode_jwt(token)
+    assert len(auth_handler._verified_tokens) == 2
+    # The oldest was evicted; it is verified again rather than rejected
+    assert decode_jwt(tokens[0])["user_id"] == "user0@example.com"
+
+
+def test_bearer_requires_a_user_id():
+    bearer = JWTBearer()
+    token = jwt.encode({"expires": time.time() + 60}, auth_handler.JWT_SECRET, algorithm=auth_handler.JWT_ALGORITHM)
+    assert not bearer.verify_jwt(token)
+    assert bearer.verify_jwt(sign_jwt("user@example.com")["access_token"])
@@ -0,0 +1,34 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+from bson.objectid import ObjectId
+
+from app.database import decode_cursor, encode_cursor
+
+
+def test_round_trip_of_a_scan_history_cursor():
+    created_at, scan_id = datetime(2024, 5, 1, 12, 30, 15, 250000), ObjectId()
+    values = decode_cursor(encode_cursor(created_at, scan_id))
+    assert values == [created_at.isoformat(), str(scan_id)]
+    assert datetime.fromisoformat(values[0]) == created_at
+    assert ObjectId(values[1]) == scan_id
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("?" * 30, ">" * 30)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "é",
+    base64.urlsafe_b64encode(b"{not json").decode("ascii"),
+    base64.urlsafe_b64encode(b'{"created_at": 1}').decode("ascii"),
+    base64.urlsafe_b64encode(b'"a string"').decode("ascii"),
+])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
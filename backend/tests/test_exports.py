@@ -0,0 +1,96 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("decouple")
+
+from app.exports import CSV_COLUMNS, csv_rows, jsonl_rows, sarif_result, sarif_rows
+
+FINDINGS = [
+    {"id": "1", "scan_id": "s", "template_id": "tls-version", "name": "TLS Version", "severity": "info",
+     "host": "example.com", "matched_at": "example.com:443", "extracted_results": ["tls10", "tls12"],
+     "description": 'Old "TLS",\nenabled', "solution": None, "fingerprint": "abc", "offloaded": ["description"]},
+    {"id": "2", "scan_id": "s", "template_id": "CVE-2021-44228", "name": "Log4Shell", "severity": "Critical",
+     "host": "example.com", "matched_at": "https://example.com/api", "solution": "Upgrade log4j"},
+    {"id": "3", "scan_id": "s", "template_id": "tls-version", "name": "TLS Version", "severity": "info",
+     "host": "api.example.com", "matched_at": "api.example.com:443"},
+]
+
+
+def collect(rows) -> bytes:
+    async def run():
+        async def findings():
+            for finding in FINDINGS:
+                yield dict(finding)
+        return b"".join([row async for row in rows(findings())])
+    return asyncio.run(run())
+
+
+def test_jsonl_drops_internal_fields():
+    lines = collect(jsonl_rows).decode("utf-8").splitlines()
+    assert len(lines) == len(FINDINGS)
+    first = json.loads(lines[0])
+    assert "offloaded" not in first
+    assert first["extracted_results"] == ["tls10", "tls12"]
+
+
+def test_csv_rows_quote_and_flatten_values():
+    rows = list(csv.reader(io.StringIO(collect(csv_rows).decode("utf-8"))))
+    assert rows[0] == list(CSV_COLUMNS)
+    assert len(rows) == len(FINDINGS) + 1
+    first = dict(zip(CSV_COLUMNS, rows[1]))
+    assert first["description"] == 'Old "TLS",\nenabled'
+    assert first["extracted_results"] == "tls10\ntls12"
+    assert first["solution"] == ""
+
+
+def test_sarif_result_levels_and_fix():
+    result = sarif_result(FINDINGS[1])
+    assert result["level"] == "error"
+    assert result["fixes"] == [{"description": {"text": "Upgrade log4j"}}]
+    assert result["locations"][0]["physicalLocation"]["artifactLocation"]["uri"] == "https://example.com/api"
+    assert sarif_result({"severity": "unknown"})["level"] == "none"
+    assert sarif_result({})["ruleId"] == "unknown"
+
+
+def test_sarif_log_is_valid_json_with_one_rule_per_template():
+    log = json.loads(collect(sarif_rows))
+    assert log["version"] == "2.1.0"
+    (run,) = log["runs"]
+    assert [result["ruleId"] for result in run["results"]] == ["tls-version", "CVE-2021-44228", "tls-version"]
+    assert [rule["id"] for rule in run["tool"]["driver"]["rules"]] == ["tls-version", "CVE-2021-44228"]
+    assert run["results"][0]["partialFingerprints"] == {"nucleiFinding/v1": "abc"}
+
+
+def test_sarif_log_without_findings():
+    async def run():
+        async def findings():
+            return
+            yield
+        return b"".join([row async for row in sarif_rows(findings())])
+    log = json.loads(asyncio.run(run()))
+    assert log["runs"][0]["results"] == []
+
+
+def test_unknown_format_is_rejected_before_any_lookup(monkeypatch):
+    pytest.importorskip("motor")
+    from fastapi import HTTPException
+
+    from app import api
+
+    async def lookup(*args, **kwargs):
+        raise AssertionError("scans were looked up")
+
+    monkeypatch.setattr(api, "retrieve_user_scan_ids", lookup)
+    monkeypatch.setattr(api, "get_scan_or_404", lookup)
+    for export in (
+        api.export_scans(None, format="xml", since=None, until=None, target=None, user_id="user@example.com"),
+        api.export_scan("000000000000000000000000", None, format="xml", user_id="user@example.com"),
+    ):
+        with pytest.raises(HTTPException) as rejected:
+            asyncio.run(export)
+        assert rejected.value.status_code == 400
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("decouple")
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from app import finding_writer
+from app.database import ensure_indexes, finding_collection, scan_collection
+from app.finding_writer import FindingWriter
+from app.scan_events import scan_events
+
+SCAN_ID = "000000000000000000000001"
+OTHER_SCAN_ID = "000000000000000000000002"
+
+
+def finding(fingerprint: str, scan_id: str = SCAN_ID) -> dict:
+    return {
+        "scan_id": scan_id, "scan_ids": [scan_id], "user_id": "user", "target": "example.com",
+        "fingerprint": fingerprint, "template_id": "tech-detect", "name": fingerprint, "status": "open",
+    }
+
+
+def drain(queue: asyncio.Queue) -> list:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+async def new_scan():
+    await scan_collection.insert_one({"_id": ObjectId(SCAN_ID), "total_vulns": 0})
+
+
+def test_findings_are_written_in_one_flush_with_their_counters(database):
+    async def run():
+        await new_scan()
+        events = scan_events.subscribe(SCAN_ID)
+        writer = FindingWriter(SCAN_ID, "user", flush_size=10, flush_interval_ms=60000)
+        for fingerprint in ("a", "b", "c"):
+            await writer.add(finding(fingerprint), {"total_vulns": 1})
+        assert await finding_collection.count_documents({}) == 0
+        await writer.close()
+        scan_events.unsubscribe(SCAN_ID, events)
+        return writer, drain(events), await scan_collection.find_one({"_id": ObjectId(SCAN_ID)})
+
+    writer, events, scan = asyncio.run(run())
+    assert writer.written == 3 and writer.failed == 0
+    assert [data["name"] for event, data in events] == ["a", "b", "c"]
+    assert scan["total_vulns"] == 3
+
+
+def test_failed_batches_are_retried(database, monkeypatch):
+    add_findings = finding_writer.add_findings
+    calls = 0
+
+    async def flaky_add_findings(findings):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise AutoReconnect("connection reset")
+        return await add_findings(findings)
+
+    monkeypatch.setattr(finding_writer, "add_findings", flaky_add_findings)
+
+    async def run():
+        await new_scan()
+        writer = FindingWriter(SCAN_ID, "user", flush_size=2, retries=2)
+        await writer.add(finding("a"), {"total_vulns": 1})
+        await writer.add(finding("b"), {"total_vulns": 1})
+        await writer.close()
+        return writer, await finding_collection.count_documents({"scan_ids": SCAN_ID})
+
+    writer, stored = asyncio.run(run())
+    assert calls == 2
+    assert writer.written == 2 and stored == 2
+
+
+def test_findings_that_keep_failing_are_counted(database, monkeypatch):
+    async def broken_add_findings(findings):
+        raise AutoReconnect("connection reset")
+
+    monkeypatch.setattr(finding_writer, "add_findings", broken_add_findings)
+
+    async def run():
+        await new_scan()
+        writer = FindingWriter(SCAN_ID, "user", flush_size=1, retries=1)
+        await writer.add(finding("a"), {"total_vulns": 1})
+        await writer.close()
+        return writer, await scan_collection.find_one({"_id": ObjectId(SCAN_ID)})
+
+    writer, scan = asyncio.run(run())
+    assert writer.failed == 1
+    assert scan["failed_writes"] == 1
+
+
+def test_duplicate_of_a_concurrent_scan_is_shared_under_its_stored_id(database):
+    async def run():
+        await ensure_indexes()
+        await new_scan()
+        stored = finding("a", scan_id=OTHER_SCAN_ID)
+        await finding_collection.insert_one(stored)
+        events = scan_events.subscribe(SCAN_ID)
+        writer = FindingWriter(SCAN_ID, "user", flush_size=2)
+        await writer.add(finding("a"), {"total_vulns": 1})
+        await writer.add(finding("b"), {"total_vulns": 1})
+        await writer.close()
+        scan_events.unsubscribe(SCAN_ID, events)
+        shared = await finding_collection.find_one({"fingerprint": "a"})
+        return stored, shared, drain(events), await finding_collection.count_documents({})
+
+    stored, shared, events, count = asyncio.run(run())
+    assert count == 2
+    assert sorted(shared["scan_ids"]) == [SCAN_ID, OTHER_SCAN_ID]
+    published = {data["name"]: data for event, data in events}
+    assert published["a"]["id"] == str(stored["_id"])
+    assert published["a"]["scan_id"] == SCAN_ID
+    assert set(published) == {"a", "b"}
+
+
+def test_seen_findings_are_tagged_and_reopened(database):
+    async def run():
+        await new_scan()
+        await finding_collection.insert_one({**finding("a", scan_id=OTHER_SCAN_ID), "status": "resolved"})
+        writer = FindingWriter(SCAN_ID, "user")
+        await writer.seen("example.com", "a", {"unchanged_vulns": 1})
+        await writer.close()
+        return (await finding_collection.find_one({"fingerprint": "a"}),
+                await scan_collection.find_one({"_id": ObjectId(SCAN_ID)}))
+
+    tagged, scan = asyncio.run(run())
+    assert tagged["status"] == "open"
+    assert SCAN_ID in tagged["scan_ids"]
+    assert scan["unchanged_vulns"] == 1
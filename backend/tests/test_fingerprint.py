@@ -0,0 +1,28 @@
+from app.fingerprint import document_fingerprint, finding_fingerprint
+
+
+def test_extracted_results_order_and_duplicates_are_ignored():
+    first = finding_fingerprint("tech-detect", "example.com", "https://example.com/", ["nginx", "php"])
+    second = finding_fingerprint("tech-detect", "example.com", "https://example.com/", ["php", "nginx", "php"])
+    assert first == second
+
+
+def test_blank_extracted_results_are_ignored():
+    assert finding_fingerprint("t", "h", "m", [" ", "", "a "]) == finding_fingerprint("t", "h", "m", ["a"])
+    assert finding_fingerprint("t", "h", "m", None) == finding_fingerprint("t", "h", "m", [])
+
+
+def test_host_is_case_and_whitespace_insensitive():
+    assert finding_fingerprint("t", " Example.COM ", "m", []) == finding_fingerprint("t", "example.com", "m", [])
+
+
+def test_fields_are_not_confused_with_each_other():
+    assert finding_fingerprint("t", "h", "m", []) != finding_fingerprint("t", "h", "", ["m"])
+    assert finding_fingerprint("a", "h", "m", []) != finding_fingerprint("b", "h", "m", [])
+    assert finding_fingerprint("t", "h", "https://h/a", []) != finding_fingerprint("t", "h", "https://h/b", [])
+
+
+def test_document_fingerprint_prefers_the_stored_one():
+    finding = {"template_id": "t", "host": "h", "matched_at": "m", "extracted_results": ["x"]}
+    assert document_fingerprint(finding) == finding_fingerprint("t", "h", "m", ["x"])
+    assert document_fingerprint({**finding, "fingerprint": "stored"}) == "stored"
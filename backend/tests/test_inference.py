@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("decouple")
+pytest.importorskip("motor")
+
+from app.inference import RemediationBatcher, extract_solution, FALLBACK_SOLUTION, is_deferred, severity_priority
+
+
+def test_severity_priority_and_deferral():
+    priorities = [severity_priority(severity) for severity in ("CRITICAL", "high", "medium", "low", "info", None)]
+    assert priorities == sorted(priorities) and len(set(priorities)) == len(priorities)
+    assert is_deferred("Low") and is_deferred(None) and not is_deferred("high")
+
+
+def test_extract_solution():
+    assert extract_solution("Vulnerability: x\nRecommended Solution: Patch it. ") == "Patch it."
+    assert extract_solution("Recommended Solution:   ") == FALLBACK_SOLUTION
+
+
+def test_most_severe_requests_are_generated_first():
+    started, release = threading.Event(), threading.Event()
+    batches = []
+
+    def generate(prompts):
+        if prompts == ["busy"]:
+            started.set()
+            release.wait(5)
+        batches.append(prompts)
+        return [prompt.upper() for prompt in prompts]
+
+    async def run():
+        batcher = RemediationBatcher(generate, batch_size=1, max_wait_ms=0)
+        busy = asyncio.create_task(batcher.generate("busy", priority=0))
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        # Queued while the inference thread is busy
+        requests = [
+            asyncio.create_task(batcher.generate(prompt, priority=priority))
+            for prompt, priority in [("low", 3), ("medium", 2), ("critical", 0), ("high", 1), ("critical 2", 0)]
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(busy, *requests)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results == ["BUSY", "LOW", "MEDIUM", "CRITICAL", "HIGH", "CRITICAL 2"]
+    assert batches == [["busy"], ["critical"], ["critical 2"], ["high"], ["medium"], ["low"]]
+
+
+def test_requests_are_batched_up_to_the_batch_size():
+    batches = []
+
+    def generate(prompts):
+        batches.append(prompts)
+        return [f"fix {prompt}" for prompt in prompts]
+
+    async def run():
+        batcher = RemediationBatcher(generate, batch_size=3, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.generate(str(index)) for index in range(5)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [f"fix {index}" for index in range(5)]
+    assert [len(batch) for batch in batches] == [3, 2]
+
+
+def test_a_failed_batch_fails_each_of_its_requests():
+    def generate(prompts):
+        raise RuntimeError("out of memory")
+
+    async def run():
+        batcher = RemediationBatcher(generate, batch_size=2, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.generate(str(index)) for index in range(2)), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
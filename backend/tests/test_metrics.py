@@ -0,0 +1,59 @@
+import pytest
+
+from app import metrics
+from app.metrics import Counter, Gauge, Histogram, render_metrics
+
+
+@pytest.fixture(autouse=True)
+def restore_registry():
+    registered = list(metrics.registry)
+    yield
+    metrics.registry[:] = registered
+
+
+def test_counter_renders_each_label_set():
+    counter = Counter("test_requests_total", "Requests", ("status",))
+    counter.inc(status="ok")
+    counter.inc(2, status="ok")
+    counter.inc(status="failed")
+    assert counter.render() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{status="ok"} 3',
+        'test_requests_total{status="failed"} 1',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_escaped_total", "Escaping", ("helper",))
+    counter.inc(helper='a"b\\c\nd')
+    assert counter.render()[-1] == 'test_escaped_total{helper="a\\"b\\\\c\\nd"} 1'
+
+
+def test_gauge_keeps_the_last_value():
+    gauge = Gauge("test_pending", "Pending")
+    gauge.set(4)
+    gauge.set(1.5)
+    assert gauge.render()[1:] == ["# TYPE test_pending gauge", "test_pending 1.5"]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Durations", ("stage",), buckets=(1, 0.1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="parse")
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{stage="parse",le="0.1"} 1',
+        'test_seconds_bucket{stage="parse",le="1"} 2',
+        'test_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'test_seconds_sum{stage="parse"} 5.55',
+        'test_seconds_count{stage="parse"} 3',
+    ]
+
+
+def test_render_metrics_includes_every_registered_metric():
+    Counter("test_rendered_total", "Rendered").inc()
+    text = render_metrics()
+    assert text.endswith("\n")
+    assert "# TYPE scans_total counter" in text
+    assert "# TYPE password_hash_pending gauge" in text
+    assert "\ntest_rendered_total 1\n" in text
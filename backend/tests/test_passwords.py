@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("bcrypt")
+pytest.importorskip("decouple")
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+
+from app.auth import passwords
+from app.auth.passwords import PasswordHasher, hash_rounds, needs_rehash
+from app.metrics import password_hash_pending, password_hash_rejected_total
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    hasher.start()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    async def run():
+        hashed = await hasher.hash("s3cret")
+        return hashed, await hasher.verify("s3cret", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(run())
+    assert hash_rounds(hashed) == 4
+    assert valid and not invalid
+    assert not needs_rehash(hashed)
+
+
+def test_full_queue_answers_503(hasher):
+    rejected = password_hash_rejected_total.values.get((), 0)
+
+    async def run():
+        first = asyncio.create_task(hasher.hash("first"))
+        await asyncio.sleep(0)
+        assert hasher.pending == 1
+        with pytest.raises(HTTPException) as busy:
+            await hasher.hash("second")
+        await first
+        return busy.value
+
+    busy = asyncio.run(run())
+    assert busy.status_code == 503
+    assert busy.headers == {"Retry-After": "1"}
+    assert password_hash_rejected_total.values[()] == rejected + 1
+    assert hasher.pending == 0
+    assert password_hash_pending.values[()] == 0
+
+
+def test_hashes_with_another_cost_need_rehashing(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 12)
+    assert needs_rehash("$2b$10$" + "x" * 53)
+    assert not needs_rehash("$2b$12$" + "x" * 53)
+    assert needs_rehash("not a bcrypt hash")
+    assert hash_rounds("not a bcrypt hash") is None
+
+
+def test_a_broken_pool_is_shut_down_and_replaced(hasher):
+    async def run():
+        hashed = await hasher.hash("s3cret")
+        broken = hasher.executor
+        shutdown = broken.shutdown
+        broken.shutdown = lambda **kwargs: shutdowns.append(kwargs) or shutdown(**kwargs)
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        return broken, await hasher.verify("s3cret", hashed)
+
+    shutdowns = []
+    broken, valid = asyncio.run(run())
+    assert valid
+    assert hasher.executor is not broken
+    assert shutdowns == [{"wait": False, "cancel_futures": True}]
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("decouple")
+from fastapi import Request
+
+from app.responses import accepts_gzip, etag_matches, make_etag
+
+
+def make_request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+ETAG = make_etag("gzip", "scan-id", 3)
+
+
+def test_etag_depends_on_parts_and_encoding():
+    assert ETAG == make_etag("gzip", "scan-id", 3)
+    assert ETAG != make_etag("gzip", "scan-id", 4)
+    assert ETAG != make_etag(None, "scan-id", 3)
+    assert make_etag(None, "x").endswith('-identity"')
+
+
+def test_etag_matches_without_header():
+    assert not etag_matches(make_request(), ETAG)
+
+
+@pytest.mark.parametrize("header", [ETAG, f"W/{ETAG}", f'"other", {ETAG}', f' "other" ,W/{ETAG} ', "*"])
+def test_etag_matches(header):
+    assert etag_matches(make_request(if_none_match=header), ETAG)
+
+
+@pytest.mark.parametrize("header", ['"other"', ETAG.strip('"'), make_etag("br", "scan-id", 3)])
+def test_etag_does_not_match(header):
+    assert not etag_matches(make_request(if_none_match=header), ETAG)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("br", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(make_request(accept_encoding=header)) is expected
+
+
+def test_findings_etag_changes_when_a_later_scan_sees_them(database):
+    from app import api
+    from app.database import finding_collection, mark_findings_seen, scan_collection
+
+    user_id = "user@example.com"
+
+    async def findings_response(scan_id: str, **headers):
+        return await api.scan_findings(
+            scan_id, make_request(**headers), limit=None, after=None, summary=False, user_id=user_id
+        )
+
+    async def run():
+        scan = await scan_collection.insert_one({
+            "user_id": user_id, "target": "example.com", "status": "completed", "created_at": datetime.utcnow(),
+            "finished_at": datetime.utcnow(), "total_vulns": 1, "solutions_generated": 0,
+        })
+        scan_id = str(scan.inserted_id)
+        await finding_collection.insert_one({
+            "user_id": user_id, "target": "example.com", "fingerprint": "abc", "scan_id": scan_id,
+            "scan_ids": [scan_id], "status": "resolved", "last_seen_at": datetime.utcnow() - timedelta(hours=1),
+        })
+        etag = (await findings_response(scan_id)).headers["ETag"]
+        unchanged = await findings_response(scan_id, if_none_match=etag)
+        await mark_findings_seen(user_id, "later-scan", [("example.com", "abc")])
+        reopened = await findings_response(scan_id, if_none_match=etag)
+        return unchanged.status_code, reopened.status_code, reopened.headers["ETag"] != etag
+
+    assert asyncio.run(run()) == (304, 200, True)
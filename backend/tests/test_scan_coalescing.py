@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+from bson import ObjectId
+
+from app import api
+from app.database import ensure_indexes, fail_interrupted_scans, renew_scan_leases, scan_collection
+
+
+@pytest.fixture
+def scan_queue(monkeypatch):
+    """An empty job queue; the workers are not started, so jobs stay queued"""
+    manager = api.ScanJobManager(api.try_generate_solution, queue_size=10)
+    monkeypatch.setattr(api, "scan_jobs", manager)
+    return manager
+
+
+def request_scan(target: str, user_id: str = "user@example.com", tags=None, max_age=None) -> dict:
+    return api.scan(target=target, tags=tags, max_age=max_age, user_id=user_id)
+
+
+def test_concurrent_requests_attach_to_one_scan(database, scan_queue):
+    async def run():
+        await ensure_indexes()
+        return await asyncio.gather(*(request_scan("example.com") for _ in range(3)))
+
+    responses = asyncio.run(run())
+    assert len({response["scan_id"] for response in responses}) == 1
+    assert sum(1 for response in responses if response.get("attached")) == 2
+    assert scan_queue.queue.qsize() == 1
+
+
+def test_other_users_and_profiles_get_their_own_scans(database, scan_queue):
+    async def run():
+        await ensure_indexes()
+        return [
+            await request_scan("example.com"),
+            await request_scan("example.com", user_id="other@example.com"),
+            await request_scan("example.com", tags="cve"),
+            await request_scan("example.com", tags="CVE, cve"),
+        ]
+
+    mine, other_user, cve, same_profile = asyncio.run(run())
+    assert len({mine["scan_id"], other_user["scan_id"], cve["scan_id"]}) == 3
+    assert same_profile == {"scan_id": cve["scan_id"], "status": "queued", "attached": True}
+
+
+def test_fresh_completed_scan_is_reused(database, scan_queue):
+    async def run():
+        finished = await scan_collection.insert_one({
+            "user_id": "user@example.com", "target": "example.com", "profile": "", "status": "completed",
+            "finished_at": datetime.utcnow() - timedelta(minutes=5),
+        })
+        return (str(finished.inserted_id), await request_scan("example.com", max_age=10),
+                await request_scan("example.com", user_id="other@example.com", max_age=10))
+
+    finished_id, reused, other_user = asyncio.run(run())
+    assert reused == {"scan_id": finished_id, "status": "completed", "reused": True}
+    assert other_user["scan_id"] != finished_id and "reused" not in other_user
+
+
+def test_only_scans_with_expired_leases_are_failed(database):
+    now = datetime.utcnow()
+
+    async def run():
+        scans = {
+            "mine": {"status": "running", "owner": "me", "lease_expires_at": now + timedelta(seconds=5)},
+            "expiring": {"status": "queued", "owner": "me", "lease_expires_at": now - timedelta(seconds=1)},
+            "dead": {"status": "running", "owner": "gone", "lease_expires_at": now - timedelta(seconds=1)},
+            "alive": {"status": "running", "owner": "other", "lease_expires_at": now + timedelta(seconds=30)},
+            "legacy": {"status": "running"},
+            "done": {"status": "completed"},
+        }
+        ids = {}
+        for name, scan in scans.items():
+            ids[name] = (await scan_collection.insert_one({**scan, "active_key": name})).inserted_id
+        # The heartbeat renews its own leases before reaping
+        await renew_scan_leases("me", now + timedelta(seconds=60))
+        failed = await fail_interrupted_scans()
+        return failed, {name: await scan_collection.find_one({"_id": _id}) for name, _id in ids.items()}
+
+    failed, scans = asyncio.run(run())
+    assert failed == 2
+    assert {name for name, scan in scans.items() if scan["status"] == "failed"} == {"dead", "legacy"}
+    assert scans["expiring"]["lease_expires_at"] > now
+    assert "active_key" not in scans["dead"] and "owner" not in scans["dead"]
+    assert scans["alive"]["active_key"] == "alive"
+
+
+def test_new_scans_are_leased_to_this_process(database, scan_queue):
+    response = asyncio.run(request_scan("example.com"))
+    scan = asyncio.run(scan_collection.find_one({"_id": ObjectId(response["scan_id"])}))
+    assert scan["owner"] == scan_queue.owner
+    assert scan["lease_expires_at"] > datetime.utcnow()
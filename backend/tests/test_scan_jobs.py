@@ -0,0 +1,202 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("decouple")
+
+from app.metrics import nuclei_parse_errors_total
+from app.scan_jobs import (
+    ScanJob, ScanJobManager, normalize_profile, parse_finding, parse_targets, shard_targets
+)
+
+
+def test_parse_targets_skips_blanks_comments_and_duplicates():
+    lines = ["example.com", "  ", "# staging", "api.example.com  ", "example.com", "\tlocalhost:8080\n"]
+    assert parse_targets(lines) == ["example.com", "api.example.com", "localhost:8080"]
+
+
+def test_parse_targets_of_nothing():
+    assert parse_targets([]) == []
+    assert parse_targets(["", "# only a comment"]) == []
+
+
+def test_shard_targets_keeps_order_and_sizes():
+    targets = [f"host{index}" for index in range(7)]
+    shards = shard_targets(targets, shard_size=3)
+    assert shards == [["host0", "host1", "host2"], ["host3", "host4", "host5"], ["host6"]]
+
+
+def test_shard_targets_edge_sizes():
+    assert shard_targets([], shard_size=3) == []
+    assert shard_targets(["a", "b"], shard_size=0) == [["a"], ["b"]]
+    assert shard_targets(["a", "b"], shard_size=10) == [["a", "b"]]
+
+
+def test_normalize_profile():
+    assert normalize_profile(None) == ""
+    assert normalize_profile(" , ") == ""
+    assert normalize_profile("XSS, cve,xss ,sqli") == "cve,sqli,xss"
+
+
+def test_parse_finding():
+    line = ('{"template-id": "tech-detect", "host": "example.com", "matched-at": "https://example.com/",'
+            ' "extracted-results": ["nginx"], "info": {"name": "Tech", "severity": "info"}}')
+    finding = parse_finding(line)
+    assert (finding.template_id, finding.name, finding.severity) == ("tech-detect", "Tech", "info")
+    assert finding.extracted_results == ["nginx"]
+    assert parse_finding('{"template": "t"}').template_id == "t"
+
+
+@pytest.mark.parametrize("line", [
+    "{not json",
+    "[1, 2]",
+    '"text"',
+    '{"info": null}',
+    '{"info": "text"}',
+    '{"info": {}, "matched-at": {"url": "x"}}',
+    '{"info": {}, "extracted-results": 5}',
+])
+def test_parse_finding_skips_odd_lines(line):
+    before = nuclei_parse_errors_total.values.get((), 0)
+    assert parse_finding(line) is None
+    assert nuclei_parse_errors_total.values[()] == before + 1
+
+
+async def no_solution(*args, **kwargs):
+    return None
+
+
+def test_run_kills_nuclei_when_reading_its_output_fails(database, monkeypatch):
+    manager = ScanJobManager(no_solution)
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def record_process(*args, **kwargs):
+        processes.append(await create_subprocess_exec(*args, **kwargs))
+        return processes[-1]
+
+    async def consume_findings(job, stdout, writer):
+        await stdout.readline()
+        raise RuntimeError("unexpected output")
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", record_process)
+    monkeypatch.setattr(manager, "nuclei_args", lambda job, targets_file=None: [
+        sys.executable, "-c", "import time; print('{}', flush=True); time.sleep(60)"
+    ])
+    monkeypatch.setattr(manager, "_consume_findings", consume_findings)
+
+    job = ScanJob(scan_id="000000000000000000000001", user_id="user", targets=["example.com"])
+    with pytest.raises(RuntimeError):
+        asyncio.run(manager.run(job))
+    assert processes[0].returncode is not None
+
+
+def test_nuclei_processes_never_exceed_the_rate_limit_together(monkeypatch):
+    monkeypatch.setattr("app.scan_jobs.NUCLEI_RATE_LIMIT", 150)
+    manager = ScanJobManager(no_solution, max_concurrency=16)
+    job = ScanJob(scan_id="scan", user_id="user", targets=["example.com"])
+    args = manager.nuclei_args(job)
+    rate_limit = int(args[args.index("-rl") + 1])
+    assert rate_limit * manager.max_concurrency <= 150
+    assert rate_limit == 9
+
+
+def test_completed_scan_fills_in_missing_solutions(database):
+    from app.database import finding_collection
+
+    async def bulk(findings):
+        return [None if finding["name"] == "unsolvable" else f"Fix {finding['name']}" for finding in findings]
+
+    manager = ScanJobManager(no_solution, defer_solution=lambda severity: severity == "low",
+                             bulk_solution_generator=bulk)
+    scan_id = "000000000000000000000001"
+    job = ScanJob(scan_id=scan_id, user_id="user", targets=["example.com"])
+
+    async def run():
+        await finding_collection.insert_many([
+            {"scan_id": scan_id, "scan_ids": [scan_id], "name": name, "severity": severity, "solution": solution}
+            for name, severity, solution in [
+                ("missing", "high", None), ("unsolvable", "high", None),
+                ("deferred", "low", None), ("solved", "high", "Already fixed"),
+            ]
+        ])
+        await manager._fill_missing_solutions(job)
+        return {finding["name"]: finding.get("solution") async for finding in finding_collection.find()}
+
+    assert asyncio.run(run()) == {
+        "missing": "Fix missing", "unsolvable": None, "deferred": None, "solved": "Already fixed"
+    }
+
+
+def nuclei_line(path: str) -> str:
+    return json.dumps({
+        "template-id": "exposed-path", "host": "example.com", "matched-at": f"https://example.com{path}",
+        "info": {"name": f"Exposed {path}", "severity": "high"},
+    })
+
+
+def run_scan(manager: ScanJobManager, monkeypatch, tmp_path, scan_id: str, lines: list):
+    """Run a scan of example.com whose nuclei prints the given lines"""
+    from bson import ObjectId
+    from app.database import scan_collection
+
+    output = tmp_path / f"{scan_id}.jsonl"
+    output.write_text("".join(line + "\n" for line in lines))
+    monkeypatch.setattr(manager, "nuclei_args", lambda job, targets_file=None: [
+        sys.executable, "-c", f"import sys; sys.stdout.write(open({str(output)!r}).read())"
+    ])
+
+    async def run():
+        await scan_collection.insert_one({"_id": ObjectId(scan_id), "user_id": "user", "target": "example.com"})
+        await manager.run(ScanJob(scan_id=scan_id, user_id="user", targets=["example.com"]))
+        return await scan_collection.find_one({"_id": ObjectId(scan_id)})
+
+    return asyncio.run(run())
+
+
+def test_rescan_stores_only_new_findings_and_resolves_missing_ones(database, monkeypatch, tmp_path):
+    from app.database import finding_collection
+
+    manager = ScanJobManager(no_solution)
+    first, second = "000000000000000000000001", "000000000000000000000002"
+    run_scan(manager, monkeypatch, tmp_path, first, [nuclei_line("/a"), nuclei_line("/b"), nuclei_line("/a")])
+    scan = run_scan(manager, monkeypatch, tmp_path, second, [nuclei_line("/a"), nuclei_line("/c")])
+
+    assert scan["status"] == "completed"
+    assert (scan["new_vulns"], scan["unchanged_vulns"], scan["resolved_vulns"]) == (1, 1, 1)
+
+    async def findings():
+        return {finding["matched_at"]: finding async for finding in finding_collection.find()}
+
+    stored = asyncio.run(findings())
+    assert sorted(stored) == ["https://example.com/a", "https://example.com/b", "https://example.com/c"]
+    assert stored["https://example.com/a"]["scan_ids"] == [first, second]
+    assert stored["https://example.com/a"]["status"] == "open"
+    assert stored["https://example.com/b"]["status"] == "resolved"
+    assert stored["https://example.com/b"]["resolved_in_scan"] == second
+    assert stored["https://example.com/c"]["scan_ids"] == [second]
+
+
+def test_reserved_slots_are_kept_for_batch_shards():
+    manager = ScanJobManager(no_solution, queue_size=3)
+    assert manager.reserve(2)
+    assert manager.free_slots() == 1
+    assert not manager.reserve(2)
+    manager.submit(ScanJob(scan_id="single", user_id="user", targets=["a"]))
+    with pytest.raises(asyncio.QueueFull):
+        manager.submit(ScanJob(scan_id="single", user_id="user", targets=["b"]))
+    for shard in range(2):
+        manager.submit(ScanJob(scan_id="batch", user_id="user", targets=["c"], shard=shard), reserved=True)
+    assert manager.queue.qsize() == 3
+    assert manager.reserved == 0 and manager.free_slots() == 0
+
+
+def test_released_slots_can_be_reserved_again():
+    manager = ScanJobManager(no_solution, queue_size=2)
+    assert manager.reserve(2)
+    manager.release(2)
+    assert manager.free_slots() == 2
+    assert manager.reserve(1)
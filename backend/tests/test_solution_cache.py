@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("decouple")
+
+from app.metrics import solution_cache_lookups_total
+from app.solution_cache import SolutionCache, solution_key
+
+
+def lookups(result: str) -> float:
+    return solution_cache_lookups_total.values.get((result,), 0)
+
+
+def test_key_ignores_case_and_whitespace_but_not_the_template():
+    key = solution_key("xss", "Reflected XSS", "Input  is\nreflected")
+    assert key == solution_key("xss", "reflected xss ", "input is reflected")
+    assert key != solution_key("xss-2", "Reflected XSS", "Input is reflected")
+    assert key.startswith("xss:")
+
+
+def test_concurrent_misses_share_one_generation(database):
+    cache = SolutionCache(collection=database["solutions"])
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "Escape the output"
+
+    async def run():
+        solutions = await asyncio.gather(*(cache.get_or_generate("xss:1", generate, "gpt2") for _ in range(5)))
+        return solutions, await database["solutions"].find_one({"_id": "xss:1"})
+
+    misses = lookups("miss")
+    solutions, stored = asyncio.run(run())
+    assert solutions == ["Escape the output"] * 5
+    assert calls == 1
+    assert lookups("miss") == misses + 1
+    assert (stored["solution"], stored["source"], stored["template_id"]) == ("Escape the output", "gpt2", "xss")
+    assert not cache.in_flight
+
+
+def test_failed_generation_reaches_every_waiter_and_is_not_cached(database):
+    cache = SolutionCache(collection=database["solutions"])
+
+    async def generate():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model failed")
+
+    async def run():
+        results = await asyncio.gather(
+            *(cache.get_or_generate("xss:1", generate, "gpt2") for _ in range(3)), return_exceptions=True
+        )
+        return results, await cache.get("xss:1")
+
+    results, cached = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cached is None
+    assert not cache.in_flight
+
+
+def test_memory_tier_expires_to_the_database_tier(database, monkeypatch):
+    cache = SolutionCache(collection=database["solutions"], ttl_seconds=60)
+    clock = [1000.0]
+    monkeypatch.setattr("app.solution_cache.time.monotonic", lambda: clock[0])
+
+    async def run():
+        await cache.set("xss:1", "Escape the output", "gpt2")
+        memory_hits, db_hits = lookups("memory_hit"), lookups("db_hit")
+        assert await cache.get("xss:1") == "Escape the output"
+        clock[0] += 61
+        assert await cache.get("xss:1") == "Escape the output"
+        return lookups("memory_hit") - memory_hits, lookups("db_hit") - db_hits
+
+    assert asyncio.run(run()) == (1, 1)
+
+
+def test_memory_tier_is_bounded(database):
+    cache = SolutionCache(collection=database["solutions"], max_size=2)
+
+    async def run():
+        for index in range(3):
+            await cache.set(f"t:{index}", f"fix {index}", "gpt2")
+
+    asyncio.run(run())
+    assert list(cache.entries) == ["t:1", "t:2"]
+
+
+def test_lookups_while_the_model_loads_count_misses(database, monkeypatch):
+    from app import inference
+
+    cache = SolutionCache(collection=database["solutions"])
+    monkeypatch.setattr(inference, "solution_cache", cache)
+    monkeypatch.setattr(inference, "model_ready", lambda: False)
+    monkeypatch.setattr(inference, "request_model", lambda: None)
+
+    async def run():
+        first = await inference.try_generate_solution("Reflected XSS", "Input is reflected", "xss")
+        await cache.set(solution_key("xss", "Reflected XSS", "Input is reflected"), "Escape the output", "gpt2")
+        return first, await inference.try_generate_solution("Reflected XSS", "Input is reflected", "xss")
+
+    misses, hits = lookups("miss"), lookups("memory_hit")
+    assert asyncio.run(run()) == (None, "Escape the output")
+    assert (lookups("miss") - misses, lookups("memory_hit") - hits) == (1, 1)
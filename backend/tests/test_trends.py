@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("decouple")
+
+from app.trends import bucket_start
+
+
+def test_day_bucket_starts_at_midnight():
+    assert bucket_start(datetime(2024, 3, 14, 23, 59, 59, 999999), "day") == datetime(2024, 3, 14)
+    assert bucket_start(datetime(2024, 3, 14), "day") == datetime(2024, 3, 14)
+
+
+@pytest.mark.parametrize("moment", [
+    datetime(2024, 3, 11, 0, 0),  # Monday
+    datetime(2024, 3, 14, 9, 30),
+    datetime(2024, 3, 17, 23, 59),  # Sunday
+])
+def test_week_bucket_starts_on_monday(moment):
+    assert bucket_start(moment, "week") == datetime(2024, 3, 11)
+
+
+def test_week_bucket_across_a_month_and_year():
+    assert bucket_start(datetime(2025, 1, 1, 8), "week") == datetime(2024, 12, 30)
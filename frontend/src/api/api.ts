@@ -72,18 +72,37 @@ export interface ScanFinding {
   matched_at: string;
   extracted_results?: string[];
   curl_command?: string;
-  solution?: string;
+  solution?: string | null;
 }
 
-export const startScan = async (target: string): Promise<ScanFinding[]> => {
+const SCAN_POLL_INTERVAL_MS = 2000;
+
+export const startScan = async (target: string, token: string): Promise<ScanFinding[]> => {
+  const headers = { Authorization: `Bearer ${token}` };
   const response = await axios.get(`${API_URL}/scan`, {
     params: { target },
+    headers,
   });
-  if (response.status !== 200) {
+  if (response.status !== 202 && response.status !== 200) {
     throw new Error("Failed to start scan");
   }
-  return response.data;
-}; 
+  const scanId: string = response.data.scan_id;
+
+  // The scan runs in the background; poll its status until it finishes
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, SCAN_POLL_INTERVAL_MS));
+    const status = await axios.get(`${API_URL}/scan/${scanId}`, { headers });
+    if (status.data.status === "completed") {
+      break;
+    }
+    if (status.data.status === "failed") {
+      throw new Error(status.data.error || "Scan failed");
+    }
+  }
+
+  const findings = await axios.get(`${API_URL}/scan/${scanId}/findings`, { headers });
+  return findings.data;
+};
 export interface ScanHistory {
   id: string;
   target: string;
@@ -112,14 +131,27 @@ export interface ScanFinding {
   matched_at: string;
   extracted_results?: string[];
   curl_command?: string;
-  solution?: string;
+  solution?: string | null;
+}
+
+export interface ScanHistoryPage {
+  scans: ScanHistory[];
+  nextCursor: string | null;
 }
 
-export const getScanHistory = async (token: string): Promise<ScanHistory[]> => {
+// One keyset page of scan history; pass nextCursor back as `after` for the next
+export const getScanHistory = async (
+  token: string,
+  after?: string | null
+): Promise<ScanHistoryPage> => {
   const response = await axios.get(`${API_URL}/scan/history`, {
-    headers: { Authorization: `Bearer ${token}` }
+    headers: { Authorization: `Bearer ${token}` },
+    params: after ? { after } : undefined
   });
-  return response.data;
+  return {
+    scans: response.data,
+    nextCursor: response.headers["x-next-cursor"] ?? null
+  };
 };
 
 export const getScanDetails = async (scanId: string, token: string): Promise<ScanHistory> => {
@@ -135,6 +167,19 @@ export const getScanFindings = async (scanId: string, token: string): Promise<Sc
   });
   return response.data;
 };
+export interface FindingSolution {
+  id: string;
+  solution: string;
+  generated: boolean;
+}
+
+// Solutions of low-severity findings are generated the first time they are requested
+export const getFindingSolution = async (findingId: string, token: string): Promise<FindingSolution> => {
+  const response = await axios.get(`${API_URL}/finding/${findingId}/solution`, {
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  return response.data;
+};
 export const getDashboardData = async (token: string) => {
   const response = await axios.get(`${API_URL}/dashboard`, {
     headers: { Authorization: `Bearer ${token}` },
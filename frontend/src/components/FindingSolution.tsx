@@ -0,0 +1,44 @@
+import { useState } from "react";
+import { Button } from "@/components/ui/button";
+import { getFindingSolution } from "@/api/api";
+
+interface FindingSolutionProps {
+  findingId: string;
+  solution?: string | null;
+  // Text shown before the solution, e.g. "Recommended Fix: "
+  label?: string;
+  className?: string;
+}
+
+// Shows a finding's recommended fix. Deferred (low-severity) findings have
+// none until it is requested, which generates and stores it on the server.
+export const FindingSolution = ({ findingId, solution, label = "", className }: FindingSolutionProps) => {
+  const [text, setText] = useState<string | null>(solution || null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+
+  const loadSolution = async () => {
+    setLoading(true);
+    setError(null);
+    try {
+      const result = await getFindingSolution(findingId, localStorage.getItem("token") || "");
+      setText(result.solution);
+    } catch (err: any) {
+      setError(err.response?.data?.detail || "Could not load the recommended fix.");
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  if (text) {
+    return <p className={className}>{label}{text}</p>;
+  }
+  return (
+    <div className="space-y-1">
+      <Button variant="outline" size="sm" onClick={loadSolution} disabled={loading}>
+        {loading ? "Generating fix..." : "Show recommended fix"}
+      </Button>
+      {error && <p className="text-xs text-destructive">{error}</p>}
+    </div>
+  );
+};
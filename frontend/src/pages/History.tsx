@@ -28,6 +28,7 @@ import {
   ScanHistory,
   ScanFinding
 } from "@/api/api";
+import { FindingSolution } from "@/components/FindingSolution";
 
 const History = () => {
   const navigate = useNavigate();
@@ -35,6 +36,8 @@ const History = () => {
   const [filterSeverity, setFilterSeverity] = useState("all");
   const [scanHistory, setScanHistory] = useState<ScanHistory[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [findings, setFindings] = useState<ScanFinding[]>([]);
   const [selectedScan, setSelectedScan] = useState<ScanHistory | null>(null);
 
@@ -52,8 +55,9 @@ const History = () => {
   const fetchHistory = async () => {
     try {
       setLoading(true);
-      const history = await getScanHistory(token!);
-      setScanHistory(history);
+      const page = await getScanHistory(token!);
+      setScanHistory(page.scans);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error("Failed to fetch scan history:", error);
     } finally {
@@ -61,6 +65,20 @@ const History = () => {
     }
   };
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await getScanHistory(token!, nextCursor);
+      setScanHistory((previous) => [...previous, ...page.scans]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Failed to fetch more scan history:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleViewFindings = async (scan: ScanHistory) => {
     try {
       setSelectedScan(scan);
@@ -293,6 +311,20 @@ const History = () => {
           </div>
         )}
 
+        {/* Older scans are fetched a page at a time */}
+        {!loading && nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button
+              variant="outline"
+              className="btn-hack"
+              onClick={handleLoadMore}
+              disabled={loadingMore}
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </Button>
+          </div>
+        )}
+
         {/* Findings Modal */}
         {selectedScan && (
           <div className="fixed inset-0 bg-black/70 flex items-center justify-center z-50">
@@ -336,11 +368,12 @@ const History = () => {
                       {finding.description && (
                         <p className="text-sm mb-2">{finding.description}</p>
                       )}
-                      {finding.solution && (
-                        <p className="text-sm text-green-400">
-                          Recommended Fix: {finding.solution}
-                        </p>
-                      )}
+                      <FindingSolution
+                        findingId={finding.id}
+                        solution={finding.solution}
+                        label="Recommended Fix: "
+                        className="text-sm text-green-400"
+                      />
                       {finding.curl_command && (
                         <pre className="text-xs bg-black/40 p-2 rounded mt-2 overflow-x-auto">
                           {finding.curl_command}
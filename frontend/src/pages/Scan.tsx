@@ -19,6 +19,7 @@ import {
 } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
 import { startScan, ScanFinding } from "@/api/api"; 
+import { FindingSolution } from "@/components/FindingSolution";
 
 const Scan = () => {
   const navigate = useNavigate();
@@ -82,15 +83,16 @@ const Scan = () => {
       }, 200);
 
       // Call the real scan API
-      const findings = await startScan(scanUrl);
+      const findings = await startScan(scanUrl, localStorage.getItem("token") || "");
 
       const transformed = findings.map((f: ScanFinding, index: number) => ({
         id: index + 1,
+        findingId: f.id,
         type: f.name || f.template_id,
         severity: f.severity?.toLowerCase() || "low",
         endpoint: f.host || scanUrl,
         description: f.description || "No description provided.",
-        solution: f.solution || "Review the vulnerability and apply appropriate fixes.",
+        solution: f.solution,
         matchedAt: f.matched_at,
         curlCommand: f.curl_command,
         extractedResults: f.extracted_results
@@ -348,7 +350,11 @@ const Scan = () => {
                           
                           <div>
                             <h4 className="text-sm font-medium text-foreground mb-1">Recommended Solution:</h4>
-                            <p className="text-sm text-matrix">{vuln.solution}</p>
+                            <FindingSolution
+                              findingId={vuln.findingId}
+                              solution={vuln.solution}
+                              className="text-sm text-matrix"
+                            />
                           </div>
 
                           {vuln.extractedResults && vuln.extractedResults.length > 0 && (